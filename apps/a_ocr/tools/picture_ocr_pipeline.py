@@ -23,13 +23,22 @@ from typing import Any, Dict, List
 from PIL import Image
 from dots_ocr.parser import DotsOCRParser
 
+try:
+    import orjson
+except ImportError:  # optional speedup, falls back to json
+    orjson = None
+
 
 # ---------- utils ----------
 def _read_json(p: str):
-    with open(p, "r", encoding="utf-8") as f:
-        return json.load(f)
+    data = Path(p).read_bytes()
+    return orjson.loads(data) if orjson is not None else json.loads(data)
 
 def _write_json(p: str, obj: Any):
+    # 병합된 layout JSON 기록 (orjson이 있으면 C 인코더로 bytes를 만들어 한 번에 씀)
+    if orjson is not None:
+        Path(p).write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+        return
     with open(p, "w", encoding="utf-8") as f:
         json.dump(obj, f, ensure_ascii=False, indent=2)
 
@@ -98,6 +107,7 @@ def run_pipeline(parser: "DotsOCRParser", input_path: str):
 
         changed = False
         crop_counter = 0  # crop 순서대로 번호 매기기
+        tmp_out = page_dir / "__tmp_pic"  # 2차 OCR 임시 출력 (페이지 처리 후 한 번에 삭제)
 
         for idx, blk in enumerate(blocks):
             if blk.get("category") != "Picture":
@@ -115,17 +125,9 @@ def run_pipeline(parser: "DotsOCRParser", input_path: str):
                 continue
 
             # run dots.ocr again on the crop with layout_all_en
-            tmp_out = page_dir / f"__tmp_pic_i{idx}"
-            tmp_parser = DotsOCRParser(
-                output_dir=str(tmp_out),
-                ip=parser.ip, port=parser.port, model_name=parser.model_name,
-                temperature=parser.temperature, top_p=parser.top_p,
-                max_completion_tokens=parser.max_completion_tokens,
-                num_thread=parser.num_thread, dpi=parser.dpi,
-                min_pixels=parser.min_pixels, max_pixels=parser.max_pixels,
-                use_hf=parser.use_hf,
-            )
-            sec = tmp_parser.parse_file(str(crop_jpg), prompt_mode="prompt_layout_all_en")
+            # (같은 설정이므로 parser를 재사용하고 출력 위치만 지정: crop마다 파서를 새로 만들면
+            #  use_hf일 때 모델을 매번 다시 로드함. 출력은 crop 이름별 하위 폴더라 서로 겹치지 않음)
+            sec = parser.parse_file(str(crop_jpg), output_dir=str(tmp_out), prompt_mode="prompt_layout_all_en")
             sec_json = None
             if sec and isinstance(sec, list) and len(sec) > 0:
                 sec_json = sec[0].get("layout_info_path")
@@ -139,21 +141,21 @@ def run_pipeline(parser: "DotsOCRParser", input_path: str):
                     print(f"Warning: Failed to read second pass results: {e}")
                     children = []
 
-            # crop된 이미지의 JSON 파일을 메인 디렉토리로 복사
+            # crop된 이미지의 JSON 파일을 메인 디렉토리로 이동 (tmp_out은 바로 삭제되므로 복사하지 않음)
             if sec_json and os.path.exists(sec_json):
                 crop_json_name = f"{page_stem}__pic_i{crop_counter}.json"
                 crop_json_path = page_dir / crop_json_name
-                shutil.copy2(sec_json, str(crop_json_path))
+                shutil.move(sec_json, str(crop_json_path))
                 print(f"Crop JSON saved to: {crop_json_path}")
 
-            shutil.rmtree(tmp_out, ignore_errors=True)
-
             if children:
                 blk["picture-children"] = children
                 changed = True
             
             crop_counter += 1  # 다음 crop을 위해 카운터 증가
 
+        shutil.rmtree(tmp_out, ignore_errors=True)
+
         if changed:
             _write_json(layout_json, blocks)
 
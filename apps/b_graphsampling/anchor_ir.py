@@ -65,7 +65,9 @@ def vectorize_to_svg(img_path: str, out_svg: str, method: str = "potrace", thres
         if not os.path.exists(svg_tmp) or not _is_valid_svg(svg_tmp):
             raise RuntimeError(f"potrace produced invalid svg: {svg_tmp}")
 
-        shutil.copyfile(svg_tmp, out_svg)
+        # 임시 SVG는 더 쓰지 않으므로 복사 대신 이동 (다른 파일시스템이면 shutil.move가 복사) 후 임시 디렉토리 삭제
+        shutil.move(svg_tmp, out_svg)
+        shutil.rmtree(tmpdir, ignore_errors=True)
         return out_svg
 
     elif method.lower() == "inkscape":
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import List, Dict, Any
 
 try:
@@ -11,6 +13,19 @@ except ImportError:  # Fallback for direct script execution
     from router import route_from_boxes, route_from_dir
     from anchor_ir import build_anchor_item
 
+# 패키지로 import될 때는 공용 orjson 직렬화 사용 (스크립트로 직접 실행하면 저장소 루트가 없을 수 있음)
+try:
+    from libs.json_io import loads_json as _loads_json, write_json_atomic as _write_json_atomic
+except ImportError:
+    _loads_json = json.loads
+
+    def _write_json_atomic(path: str, data: Any) -> None:
+        """임시 파일에 쓴 뒤 os.replace로 교체 (중단 시 부분 파일 방지)"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
 
 def _infer_type_from_category(category: str) -> str:
     mapping = {
@@ -76,23 +91,41 @@ def load_boxes_from_problem_dir(problem_dir: str) -> List[Dict[str, Any]]:
     return data  # list of boxes with bbox, category, text
 
 
+def _fsync_dir(directory: str) -> None:
+    """교체된 디렉토리 엔트리를 한 번의 fsync로 반영 (O_DIRECTORY 미지원 플랫폼은 생략)"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
 def build_outputschema(problem_dir: str, output_path: str, args: Any | None = None) -> Dict[str, Any]:
+    # 디렉토리를 한 번만 훑어 원본 JSON과 crop 이미지(__pic_i 패턴)를 함께 분류
+    json_files = []
+    crop_images = []
+    with os.scandir(problem_dir) as entries:
+        for entry in entries:
+            name = entry.name
+            if "__pic_i" in name:
+                if name.endswith((".jpg", ".jpeg", ".png")):
+                    crop_images.append(entry.path)
+            elif name.endswith(".json"):
+                json_files.append(name)
+
     # 기존 a_ocr JSON 파일 찾기 (원본 JSON)
-    json_files = [f for f in os.listdir(problem_dir) if f.endswith(".json") and "__pic_i" not in f]
     if not json_files:
         print("[WARN] No original OCR JSON found")
         return {}
     
-    # 원본 JSON 로드
-    original_json_path = os.path.join(problem_dir, json_files[0])
-    with open(original_json_path, "r", encoding="utf-8") as f:
-        original_data = json.load(f)
-    
-    # crop된 이미지 파일 찾기 (__pic_i 패턴, 순서대로)
-    crop_images = []
-    for f in os.listdir(problem_dir):
-        if "__pic_i" in f and any(f.endswith(ext) for ext in [".jpg", ".jpeg", ".png"]):
-            crop_images.append(os.path.join(problem_dir, f))
+    # 원본 JSON 로드 (같은 디렉토리에 vector_anchors.json/spec_*.json도 있으므로 problem.json 우선)
+    original_name = "problem.json" if "problem.json" in json_files else json_files[0]
+    original_json_path = os.path.join(problem_dir, original_name)
+    # vector_anchors를 덧붙여 다시 쓰므로 공유 캐시(load_ocr_json) 대신 새로 파싱
+    with open(original_json_path, "rb") as f:
+        original_data = _loads_json(f.read())
     
     # 순서대로 정렬 (__pic_i0, __pic_i1, __pic_i2, ...)
     crop_images.sort(key=lambda x: int(x.split("__pic_i")[1].split(".")[0]) if "__pic_i" in x else 0)
@@ -123,20 +156,27 @@ def build_outputschema(problem_dir: str, output_path: str, args: Any | None = No
                     if isinstance(item, dict) and item.get("category") == "Picture":
                         picture_items.append(item)
             
-            # 각 crop 이미지에 대해 vector화
-            for i, crop_image in enumerate(crop_images):
-                print(f"[b_graphsampling] Processing crop image {i}: {crop_image}")
-                
-                anchor_item = build_anchor_item(
-                    image_path=crop_image,
-                    frame_w=fw,
-                    frame_h=fh,
-                    dpi=getattr(args, "dpi", 300),
-                    vectorizer=getattr(args, "vectorizer", "potrace"),
-                    points_per_path=getattr(args, "points_per_path", 600),
-                    crop_bbox=None,  # crop된 이미지 전체 사용
-                )
-                
+            # 각 crop 이미지에 대해 vector화 (crop끼리 독립적이므로 여러 개면 스레드 풀 사용)
+            # 무거운 부분은 potrace 서브프로세스와 cv2라 GIL을 놓음; 스레드가 도는 프로세스(e2e prefetch, 서버)에서
+            # fork하는 프로세스 풀은 교착 위험이 있어 쓰지 않음
+            vectorize = partial(
+                build_anchor_item,
+                frame_w=fw,
+                frame_h=fh,
+                dpi=getattr(args, "dpi", 300),
+                vectorizer=getattr(args, "vectorizer", "potrace"),
+                points_per_path=getattr(args, "points_per_path", 600),
+                crop_bbox=None,  # crop된 이미지 전체 사용
+            )
+            print("\n".join(f"[b_graphsampling] Processing crop image {i}: {crop_image}" for i, crop_image in enumerate(crop_images)))
+            workers = min(os.cpu_count() or 1, len(crop_images))
+            if workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    anchor_items = list(pool.map(vectorize, crop_images))
+            else:
+                anchor_items = [vectorize(crop_image) for crop_image in crop_images]
+
+            for i, (crop_image, anchor_item) in enumerate(zip(crop_images, anchor_items)):
                 # 각 anchor_item에 이미지 인덱스 정보 추가
                 anchor_item["image_index"] = i
                 anchor_item["image_path"] = crop_image
@@ -147,8 +187,7 @@ def build_outputschema(problem_dir: str, output_path: str, args: Any | None = No
                     picture_items[i]["vector_anchors"] = anchor_item
             
             # 1. 기존 JSON에 vector_anchors 추가 (기존 기능 유지)
-            with open(original_json_path, "w", encoding="utf-8") as f:
-                json.dump(original_data, f, ensure_ascii=False, indent=2)
+            _write_json_atomic(original_json_path, original_data)
             
             print(f"[b_graphsampling] Added vector_anchors to {len(picture_items)} Picture blocks in {original_json_path}")
             
@@ -159,8 +198,8 @@ def build_outputschema(problem_dir: str, output_path: str, args: Any | None = No
                 "total_images": len(vector_anchors_list),
                 "vector_anchors": vector_anchors_list
             }
-            with open(vector_file_path, "w", encoding="utf-8") as f:
-                json.dump(vector_data, f, ensure_ascii=False, indent=2)
+            _write_json_atomic(vector_file_path, vector_data)
+            _fsync_dir(problem_dir)
             
             print(f"[b_graphsampling] Created separate vector file with {len(vector_anchors_list)} images: {vector_file_path}")
             
@@ -209,7 +248,8 @@ def main():
         return
 
     # If not a single problem dir, process each subdirectory that contains a problem JSON
-    subdirs = [os.path.join(target, d) for d in os.listdir(target) if os.path.isdir(os.path.join(target, d))]
+    with os.scandir(target) as it:
+        subdirs = [e.path for e in it if e.is_dir()]
     processed = 0
     for sd in subdirs:
         if is_problem_dir(sd):
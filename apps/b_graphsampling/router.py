@@ -30,9 +30,11 @@ def route_from_dir(problem_dir: str) -> Dict:
     - If JSON exists with boxes, uses it to refine list detection.
     """
     image_exts = {".jpg", ".jpeg", ".png"}
-    has_diagram = any(os.path.splitext(f)[1].lower() in image_exts for f in os.listdir(problem_dir))
+    with os.scandir(problem_dir) as it:
+        names = [e.name for e in it if e.is_file()]
+    has_diagram = any(os.path.splitext(f)[1].lower() in image_exts for f in names)
     # Try to detect list categories from JSON if present
-    json_files = [f for f in os.listdir(problem_dir) if f.lower().endswith(".json")]
+    json_files = [f for f in names if f.lower().endswith(".json")]
     has_list = False
     if json_files:
         import json
@@ -5,21 +5,27 @@ from __future__ import annotations
 import base64
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 import tomllib
 from dotenv import load_dotenv
-from openai import OpenAI
 
-from pipelines.utils import strip_code_fences
+from libs.json_io import write_json_atomic
+from libs.llm_cache import cached_chat_completion
+from pipelines.utils import find_crop_images, list_dir_names, strip_code_fences
 
 BASE_DIR = Path(__file__).resolve().parent
 CONFIG_DIR = BASE_DIR.parent.parent / "configs"
 SYSTEM_PROMPT_PATH = BASE_DIR / "geo_system_prompt.txt"
 
+# 이미지별 spec LLM 호출 동시 실행 수 (이미지끼리는 서로 독립)
+MAX_CONCURRENT_SPECS = 4
+
 DEFAULT_BOX = {"min": [-6.0, -3.0], "max": [6.0, 3.0], "margin": 0.2}
 DEFAULT_NOTES = [
     "Fill in the geometric constraints before running geo_compute.",
@@ -37,6 +43,11 @@ class SpecPaths:
     spec_path: Path
 
 
+def _utc_timestamp() -> str:
+    """``meta.created_at``용 UTC ISO-8601 타임스탬프 (deprecated ``utcnow()`` 대체)"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
 def _load_json(path: Path) -> Any:
     with path.open("r", encoding="utf-8") as fh:
         return json.load(fh)
@@ -50,11 +61,10 @@ def load_system_prompt() -> str:
     )
 
 
-def _load_openai_config() -> Dict[str, Any]:
-    cfg_path = CONFIG_DIR / "openai.toml"
-    if not cfg_path.exists():
-        return {"model": "gpt-4o-mini", "temperature": 0.0}
-    with cfg_path.open("rb") as fh:
+@lru_cache(maxsize=4)
+def _read_openai_config(path: str, mtime_ns: int) -> Dict[str, Any]:
+    # mtime_ns는 캐시 키 용도: 파일이 바뀌면 다시 파싱
+    with open(path, "rb") as fh:
         cfg = tomllib.load(fh)
     section = cfg.get("geo_codegen") or cfg.get("default", {})
     return {
@@ -63,6 +73,16 @@ def _load_openai_config() -> Dict[str, Any]:
     }
 
 
+def _load_openai_config() -> Dict[str, Any]:
+    """openai.toml 모델 설정 (파일 mtime이 같으면 파싱 결과 재사용)"""
+    cfg_path = CONFIG_DIR / "openai.toml"
+    try:
+        mtime_ns = os.stat(cfg_path).st_mtime_ns
+    except FileNotFoundError:
+        return {"model": "gpt-4o-mini", "temperature": 0.0}
+    return dict(_read_openai_config(os.fspath(cfg_path), mtime_ns))
+
+
 def _default_spec_template() -> Dict[str, Any]:
     return {
         "type": "__TBD__",
@@ -132,22 +152,16 @@ def _encode_image(path: Path) -> Optional[Dict[str, str]]:
     return {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{data}"}}
 
 
-def _find_crop_images(problem_dir: Path) -> List[Path]:
-    """crop된 이미지 파일들을 찾아서 반환"""
-    crop_images = []
-    for pattern in ["*__pic_i*.jpg", "*__pic_i*.png", "*__pic_i*.jpeg"]:
-        crop_images.extend(sorted(problem_dir.glob(pattern)))
-    return crop_images
-
-
-def _generate_spec_for_single_image(image_index: int, vector_anchor_item: Dict[str, Any], crop_images: List[Path], paths: SpecPaths) -> Optional[tuple[Dict[str, Any], Dict[str, Any]]]:
-    """개별 이미지에 대해 spec을 생성"""
+def _generate_spec_for_single_image(image_index: int, vector_anchor_item: Dict[str, Any], crop_images: List[Path], paths: SpecPaths, refresh: bool = False) -> Optional[tuple[Dict[str, Any], Dict[str, Any]]]:
+    """개별 이미지에 대해 spec을 생성 (``refresh``면 LLM 응답 캐시를 읽지 않음)"""
     
     # .env에서 GPT API 키 읽기
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         return None
 
+    from openai import OpenAI  # 무거운 import라 LLM을 실제로 호출할 때만
+
     cfg = _load_openai_config()
     client = OpenAI(api_key=api_key)
 
@@ -173,15 +187,16 @@ def _generate_spec_for_single_image(image_index: int, vector_anchor_item: Dict[s
     ]
 
     try:
-        response = client.chat.completions.create(
+        content = cached_chat_completion(
+            client,
             model=cfg.get("model", "gpt-4o-mini"),
             temperature=cfg.get("temperature", 0.0),
             messages=messages,
+            refresh=refresh,
         )
     except Exception:
         return None
 
-    content = response.choices[0].message.content or ""
     candidate_text = strip_code_fences(content).strip()
     
     # 그래프인 경우 빈 문자열이 반환됨
@@ -202,7 +217,7 @@ def _generate_spec_for_single_image(image_index: int, vector_anchor_item: Dict[s
         "image_index": image_index
     }
 
-def _generate_spec_via_llm(paths: SpecPaths) -> Optional[tuple[Dict[str, Any], Dict[str, Any]]]:
+def _generate_spec_via_llm(paths: SpecPaths, refresh: bool = False) -> Optional[tuple[Dict[str, Any], Dict[str, Any]]]:
     # vector_anchors.json 파일 찾기
     vector_path = paths.problem_dir / "vector_anchors.json"
     if not vector_path.exists():
@@ -216,7 +231,7 @@ def _generate_spec_via_llm(paths: SpecPaths) -> Optional[tuple[Dict[str, Any], D
         return None
 
     # crop된 이미지 찾기
-    crop_images = _find_crop_images(paths.problem_dir)
+    crop_images = find_crop_images(paths.problem_dir)
     
     vector_anchors = vector_data.get("vector_anchors", [])
     if not vector_anchors:
@@ -228,7 +243,7 @@ def _generate_spec_via_llm(paths: SpecPaths) -> Optional[tuple[Dict[str, Any], D
     for i, vector_anchor_item in enumerate(vector_anchors):
         print(f"[c_geo_codegen] Generating spec for image {i + 1}/{len(vector_anchors)}")
         
-        spec_result = _generate_spec_for_single_image(i, vector_anchor_item, crop_images, paths)
+        spec_result = _generate_spec_for_single_image(i, vector_anchor_item, crop_images, paths, refresh)
         if spec_result:
             spec_obj, meta = spec_result
             # 각 spec에 이미지 인덱스 정보 추가
@@ -257,9 +272,12 @@ def generate_specs_for_all_images(
     paths = SpecPaths(problem_dir=problem_dir_path, spec_path=problem_dir_path / "spec.json")
     paths.problem_dir.mkdir(parents=True, exist_ok=True)
 
+    # 디렉토리 목록은 한 번만 읽어 vector/crop/기존 spec 확인에 공유
+    names = list_dir_names(paths.problem_dir)
+
     # vector_anchors.json 파일 찾기
     vector_path = paths.problem_dir / "vector_anchors.json"
-    if not vector_path.exists():
+    if vector_path.name not in names:
         print(f"[c_geo_codegen] No vector_anchors.json found in {paths.problem_dir}")
         return []
 
@@ -270,47 +288,61 @@ def generate_specs_for_all_images(
         return []
 
     # crop된 이미지 찾기
-    crop_images = _find_crop_images(paths.problem_dir)
+    crop_images = find_crop_images(paths.problem_dir, names)
     
     vector_anchors = vector_data.get("vector_anchors", [])
     if not vector_anchors:
         print(f"[c_geo_codegen] No vector anchors found in vector_anchors.json")
         return []
     
-    generated_specs = []
-    
-    # 각 이미지에 대해 개별적으로 spec 생성
-    for i, vector_anchor_item in enumerate(vector_anchors):
-        print(f"[c_geo_codegen] Generating spec for image {i + 1}/{len(vector_anchors)}")
-        
-        # 개별 spec 파일 경로
+    # 1) 기존 spec 재사용 여부 결정
+    existing: Dict[int, Dict[str, Any]] = {}
+    pending: List[int] = []
+    for i in range(len(vector_anchors)):
         spec_path = problem_dir_path / f"spec_{i}.json"
-        
         # 이미 존재하고 overwrite가 False면 건너뛰기
-        if spec_path.exists() and not overwrite:
+        if spec_path.name in names and not overwrite:
             print(f"[c_geo_codegen] spec_{i}.json already exists, skipping")
             try:
-                existing_spec = _load_json(spec_path)
-                generated_specs.append(existing_spec)
+                existing[i] = _load_json(spec_path)
                 continue
             except Exception:
                 print(f"[c_geo_codegen] Failed to load existing spec_{i}.json, regenerating")
-        
-        spec_result = _generate_spec_for_single_image(i, vector_anchor_item, crop_images, paths)
+        pending.append(i)
+
+    # 2) 이미지별 LLM 호출을 동시에 실행 (응답 대기 시간이 이미지 수만큼 누적되지 않도록)
+    results: Dict[int, Any] = {}
+    if pending:
+        print("\n".join(f"[c_geo_codegen] Generating spec for image {i + 1}/{len(vector_anchors)}" for i in pending))
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_SPECS, len(pending))) as pool:
+            futures = {
+                i: pool.submit(_generate_spec_for_single_image, i, vector_anchors[i], crop_images, paths, overwrite)
+                for i in pending
+            }
+        results = {i: future.result() for i, future in futures.items()}
+
+    # 3) 이미지 순서대로 저장/수집
+    generated_specs = []
+    for i, vector_anchor_item in enumerate(vector_anchors):
+        if i in existing:
+            generated_specs.append(existing[i])
+            continue
+
+        spec_path = problem_dir_path / f"spec_{i}.json"
+        spec_result = results.get(i)
         if spec_result:
             spec_obj, meta = spec_result
             # 각 spec에 이미지 인덱스 정보 추가
             spec_obj["meta"] = spec_obj.get("meta", {})
             spec_obj["meta"]["image_index"] = i
             spec_obj["meta"]["image_path"] = vector_anchor_item.get("image_path", "")
-            spec_obj["meta"]["created_at"] = datetime.utcnow().isoformat() + "Z"
+            spec_obj["meta"]["created_at"] = _utc_timestamp()
             spec_obj["meta"]["generated_by"] = "llm"
             spec_obj["meta"]["llm"] = meta
             
             # 개별 spec 파일 저장
             spec_path.parent.mkdir(parents=True, exist_ok=True)
-            with spec_path.open("w", encoding="utf-8") as fh:
-                json.dump(spec_obj, fh, ensure_ascii=False, indent=2)
+            write_json_atomic(spec_path, spec_obj)
             
             print(f"[c_geo_codegen] Generated spec_{i}.json")
             generated_specs.append(spec_obj)
@@ -346,7 +378,7 @@ def generate_spec(
 
     llm_result: Optional[tuple[Dict[str, Any], Dict[str, Any]]] = None
     if not template:
-        llm_result = _generate_spec_via_llm(paths)
+        llm_result = _generate_spec_via_llm(paths, refresh=overwrite)
 
     if template:
         spec = template.copy()
@@ -359,7 +391,7 @@ def generate_spec(
 
     spec = _ensure_spec_shape(spec)
     meta = spec.setdefault("meta", {})
-    meta["created_at"] = datetime.utcnow().isoformat() + "Z"
+    meta["created_at"] = _utc_timestamp()
 
     if llm_result:
         meta["generated_by"] = "llm"
@@ -371,8 +403,7 @@ def generate_spec(
     spec["status"] = "draft"
 
     paths.spec_path.parent.mkdir(parents=True, exist_ok=True)
-    with paths.spec_path.open("w", encoding="utf-8") as fh:
-        json.dump(spec, fh, ensure_ascii=False, indent=2)
+    write_json_atomic(paths.spec_path, spec)
 
     return spec
 
@@ -1,6 +1,6 @@
 """Deterministic geo-compute stage wrappers."""
 
-from .planner import solve_spec, solve_spec_file, solve_in_problem_dir, solve_all_specs_in_problem_dir
+from .planner import solve_spec, solve_spec_file, solve_in_problem_dir, solve_all_specs_in_problem_dir, iter_solve_all_specs
 
-__all__ = ["solve_spec", "solve_spec_file", "solve_in_problem_dir", "solve_all_specs_in_problem_dir"]
+__all__ = ["solve_spec", "solve_spec_file", "solve_in_problem_dir", "solve_all_specs_in_problem_dir", "iter_solve_all_specs"]
 
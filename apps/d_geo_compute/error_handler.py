@@ -7,6 +7,8 @@ from typing import Dict, Any, Optional
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from libs.json_io import write_json_atomic
+
 load_dotenv()
 
 
@@ -50,8 +52,7 @@ def retry_with_fix(problem_dir: Path, spec_path: Path, error_msg: str) -> Dict[s
         return {"status": "error", "error": "GPT fix failed"}
     
     # Save fixed spec
-    with spec_path.open("w", encoding="utf-8") as f:
-        json.dump(fixed_spec, f, ensure_ascii=False, indent=2)
+    write_json_atomic(spec_path, fixed_spec)
     
     # Retry
     try:
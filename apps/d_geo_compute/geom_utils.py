@@ -40,17 +40,43 @@ def ensure_ccw(*pts):
 
 def diag_cross_inside(A,B,C,D): return seg_x(A,C,B,D)
 
+# --- 배치 버전: 마지막 축이 좌표(3), 앞쪽 축은 브랜치(K) 등으로 브로드캐스트 -------------
+def rotate_many(v, angs):
+    """v를 여러 각도로 회전: v (3,) 또는 (K,3), 각도 (K,) → (K,3)"""
+    v = np.asarray(v, float)
+    c, s = np.cos(angs), np.sin(angs)
+    x, y, z = v[...,0], v[...,1], v[...,2]
+    return np.stack([c*x - s*y, s*x + c*y, np.broadcast_to(z, np.broadcast(c, z).shape)], axis=-1)
+
+def orient2d_many(a,b,c):
+    return (b[...,0]-a[...,0])*(c[...,1]-a[...,1]) - (b[...,1]-a[...,1])*(c[...,0]-a[...,0])
+
+def on_seg_many(a,b,p):
+    return ((np.minimum(a[...,0],b[...,0])-EPS<=p[...,0]) & (p[...,0]<=np.maximum(a[...,0],b[...,0])+EPS)
+            & (np.minimum(a[...,1],b[...,1])-EPS<=p[...,1]) & (p[...,1]<=np.maximum(a[...,1],b[...,1])+EPS))
+
+def seg_x_many(p1,p2,p3,p4):
+    o1=orient2d_many(p1,p2,p3); o2=orient2d_many(p1,p2,p4); o3=orient2d_many(p3,p4,p1); o4=orient2d_many(p3,p4,p2)
+    return (((o1*o2<-EPS) & (o3*o4<-EPS))
+            | ((np.abs(o1)<=EPS) & on_seg_many(p1,p2,p3))
+            | ((np.abs(o2)<=EPS) & on_seg_many(p1,p2,p4))
+            | ((np.abs(o3)<=EPS) & on_seg_many(p3,p4,p1))
+            | ((np.abs(o4)<=EPS) & on_seg_many(p3,p4,p2)))
+
+def area_signed_many(polys):
+    """(K,N,3) 다각형 묶음 → (K,) 부호 있는 넓이"""
+    x=polys[...,0]; y=polys[...,1]
+    return 0.5*(np.sum(x*np.roll(y,-1,axis=-1), axis=-1) - np.sum(y*np.roll(x,-1,axis=-1), axis=-1))
+
+def diag_cross_inside_many(A,B,C,D): return seg_x_many(A,C,B,D)
+
 def fit_into_box(pts, box_min, box_max, margin=0.2):
     P = np.array(pts, float)
-    pmin = P[:,:2].min(axis=0); pmax = P[:2].max(axis=0) if P.ndim==1 else P[:,:2].max(axis=0)
-    pmax = P[:,:2].max(axis=0)
+    pmin = P[:,:2].min(axis=0); pmax = P[:,:2].max(axis=0)
     size = pmax - pmin
     box  = (box_max - box_min)[:2] - margin*2
     s = float(min(box[0]/max(size[0],EPS), box[1]/max(size[1],EPS)))
     o = box_min[:2] + margin
-    out=[]
-    for p in pts:
-        q = np.array(p, float)
-        q[:2] = (q[:2] - pmin) * s + o
-        out.append(q)
-    return out, s
+    # 점별 루프 대신 (N,3) 배열 전체를 한 번에 변환
+    P[:,:2] = (P[:,:2] - pmin) * s + o
+    return list(P), s
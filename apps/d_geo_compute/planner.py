@@ -1,6 +1,8 @@
 ﻿from __future__ import annotations
 import json, os, numpy as np
 
+from libs.json_io import write_json_atomic
+
 from .geom_utils import v3, rotate, fit_into_box
 from .templates import solve_quad_diaglen_ang, solve_square_with_ADE
 
@@ -29,36 +31,37 @@ def scale_into_box(points:dict, box):
     return {k:arr[i] for i,k in enumerate(order)}, s
 
 
-def solve_all_specs_in_problem_dir(problem_dir, overwrite=True):
-    """Solve all geometric problems (spec_0.json, spec_1.json, ...) in a problem directory.
+def iter_solve_all_specs(problem_dir, overwrite=True):
+    """Solve all spec_*.json files in a problem directory, yielding one result at a time.
+    
+    Each result is written to ``geo_result_<i>.json`` before it is yielded, so
+    callers that only need a summary do not have to hold every solution in memory.
     
     Args:
         problem_dir: Path to the problem directory
         overwrite: Whether to overwrite existing results
         
-    Returns:
-        List of dictionaries containing solution status and metadata for each spec
+    Yields:
+        Dictionary containing solution status and metadata for each spec
     """
     from pathlib import Path
-    import glob
     
     problem_dir = Path(problem_dir)
-    results = []
     
     # Find all spec_*.json files
-    spec_files = sorted(glob.glob(str(problem_dir / "spec_*.json")))
+    spec_files = sorted(problem_dir.glob("spec_*.json"))
     
     if not spec_files:
-        return [{
+        yield {
             "status": "error",
             "error": f"No spec_*.json files found in {problem_dir}"
-        }]
+        }
+        return
     
     print(f"[d_geo_compute] Found {len(spec_files)} spec files to process")
     
-    for spec_file in spec_files:
-        spec_path = Path(spec_file)
-        image_index = int(spec_path.stem.split('_')[1])  # spec_0.json -> 0
+    for spec_path in spec_files:
+        image_index = int(spec_path.stem[5:])  # spec_0.json -> 0
         result_path = problem_dir / f"geo_result_{image_index}.json"
         
         print(f"[d_geo_compute] Processing {spec_path.name} -> {result_path.name}")
@@ -68,18 +71,20 @@ def solve_all_specs_in_problem_dir(problem_dir, overwrite=True):
             try:
                 with result_path.open("r", encoding="utf-8") as f:
                     existing_result = json.load(f)
-                results.append({
+                existing = {
                     "status": "skipped",
                     "reason": "Result already exists and overwrite=False",
                     "spec_path": str(spec_path),
                     "result_path": str(result_path),
                     "image_index": image_index,
                     "existing_result": existing_result
-                })
-                continue
+                }
             except Exception as e:
                 # If we can't read existing result, proceed with solving
-                pass
+                existing = None
+            if existing is not None:
+                yield existing
+                continue
         
         # Load and solve the specification
         try:
@@ -109,24 +114,34 @@ def solve_all_specs_in_problem_dir(problem_dir, overwrite=True):
                 }
             
             # Save result to file
-            with result_path.open("w", encoding="utf-8") as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            write_json_atomic(result_path, result)
             
-            results.append(result)
             print(f"[d_geo_compute] Successfully solved {spec_path.name}")
             
         except Exception as e:
-            error_result = {
+            result = {
                 "status": "error",
                 "error": str(e),
                 "spec_path": str(spec_path),
                 "result_path": str(result_path),
                 "image_index": image_index
             }
-            results.append(error_result)
             print(f"[d_geo_compute] Failed to solve {spec_path.name}: {e}")
+        
+        yield result
+
+
+def solve_all_specs_in_problem_dir(problem_dir, overwrite=True):
+    """Solve all geometric problems (spec_0.json, spec_1.json, ...) in a problem directory.
     
-    return results
+    Args:
+        problem_dir: Path to the problem directory
+        overwrite: Whether to overwrite existing results
+        
+    Returns:
+        List of dictionaries containing solution status and metadata for each spec
+    """
+    return list(iter_solve_all_specs(problem_dir, overwrite=overwrite))
 
 def solve_in_problem_dir(problem_dir, overwrite=True):
     """Solve geometric problems in a problem directory.
@@ -199,8 +214,7 @@ def solve_in_problem_dir(problem_dir, overwrite=True):
     
     # Save result to file
     try:
-        with result_path.open("w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        write_json_atomic(result_path, result)
         result["result_path"] = str(result_path)
     except Exception as e:
         result["status"] = "error"
@@ -1,23 +1,31 @@
 ﻿from __future__ import annotations
+import math
 import numpy as np
 
-from .geom_utils import v3, unit, rotate, seg_x, area_signed, diag_cross_inside
+from .geom_utils import v3, unit, rotate_many, seg_x_many, area_signed_many, diag_cross_inside_many
+
+# (sA, sD) 브랜치 순서: 기존 이중 루프(+1,-1)×(+1,-1)와 동일
+_BRANCH_SIGNS = np.array([[+1,+1],[+1,-1],[-1,+1],[-1,-1]], dtype=float)
+
+_SQRT3_OVER_2 = math.sqrt(3)/2
 
 # === A1: 기준선 AD + 대각선 길이 AC/BD + 각 ∠DAC, ∠ADB ======================
 def solve_quad_diaglen_ang(A, D, theta_A_deg, theta_D_deg, AC_len, BD_len):
     """라벨 고정. 4브랜치(±θ_A × ±θ_D) 중 단순/CCW/대각교차를 만족하는 해."""
     uAD = unit(D - A); uDA = -uAD
     thA = np.deg2rad(theta_A_deg); thD = np.deg2rad(theta_D_deg)
-    for sA in (+1,-1):
-        for sD in (+1,-1):
-            C = A + rotate(uAD, sA*thA) * AC_len
-            B = D + rotate(uDA, sD*thD) * BD_len
-            # 단순/CCW/대각 교차 내부
-            if seg_x(A,B,C,D) or seg_x(B,C,A,D):  continue
-            if area_signed([A,B,C,D]) <= 0:       continue
-            if not diag_cross_inside(A,B,C,D):    continue
-            return dict(A=A,B=B,C=C,D=D)
-    return None
+    # 4브랜치를 (4,3) 배열로 한 번에 계산
+    C = A + rotate_many(uAD, _BRANCH_SIGNS[:,0]*thA) * AC_len
+    B = D + rotate_many(uDA, _BRANCH_SIGNS[:,1]*thD) * BD_len
+    A4 = np.broadcast_to(A, C.shape); D4 = np.broadcast_to(D, C.shape)
+    # 단순/CCW/대각 교차 내부
+    ok = ~seg_x_many(A4,B,C,D4) & ~seg_x_many(B,C,A4,D4)
+    ok &= area_signed_many(np.stack([A4,B,C,D4], axis=1)) > 0
+    ok &= diag_cross_inside_many(A4,B,C,D4)
+    if not ok.any():
+        return None
+    i = int(np.argmax(ok))
+    return dict(A=A,B=B[i],C=C[i],D=D)
 
 # === R1: 직각점 C + 길이(AB, AD, CD 등)로 삼각/사변형 ==========================
 def solve_right_at_C(AB, AD, CD):
@@ -32,5 +40,5 @@ def solve_square_with_ADE(side, angle_ADE_deg):
     # 유도 결과: E=(3/4*side, (sqrt(3)/4)*side*2) = (0.75s, (sqrt3)/2 * s /?)  → 사례별 수치로 대입 권장
     # 교재형(문항 13) 해: E=(6, 2√3) when side=8
     s=side
-    E=v3(0.75*s, (np.sqrt(3)/4)*s*2)  # = (0.75s, 0.8660s)  [각=60° 만족]
+    E=v3(0.75*s, _SQRT3_OVER_2*s)  # = (0.75s, 0.8660s)  [각=60° 만족]
     return dict(A=A,B=B,C=C,D=D,E=E)
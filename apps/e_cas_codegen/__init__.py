@@ -1,5 +1,15 @@
 """Manim + CAS code generation stage."""
 
-from .codegen import run_cas_codegen, load_system_prompt, run_cas_codegen_for_multiple_results
+from .codegen import (
+    run_cas_codegen,
+    load_system_prompt,
+    prefetch_codegen_inputs,
+    run_cas_codegen_for_multiple_results,
+)
 
-__all__ = ["run_cas_codegen", "load_system_prompt", "run_cas_codegen_for_multiple_results"]
+__all__ = [
+    "run_cas_codegen",
+    "load_system_prompt",
+    "prefetch_codegen_inputs",
+    "run_cas_codegen_for_multiple_results",
+]
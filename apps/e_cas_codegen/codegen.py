@@ -5,14 +5,21 @@ from __future__ import annotations
 import base64
 import json
 import os
-import re
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
 
 import tomllib
 from dotenv import load_dotenv
-from openai import OpenAI
+
+from libs.json_io import dumps_json, loads_json, write_files
+from libs.llm_cache import cached_chat_completion
+from pipelines.utils import find_crop_images, has_pictures_in_ocr, load_ocr_json
+
+# openai 패키지 import는 무거우므로 실제로 클라이언트를 만들 때만 (재사용/키 없음 경로는 import 안 함)
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 BASE_DIR = Path(__file__).resolve().parent
 CONFIG_DIR = BASE_DIR.parent.parent / "configs"
@@ -47,11 +54,10 @@ def load_system_prompt() -> str:
     return "You are a Manim+CAS code generator."
 
 
-def _load_openai_config() -> Dict[str, Any]:
-    cfg_path = CONFIG_DIR / "openai.toml"
-    if not cfg_path.exists():
-        return {"model": "gpt-4o-mini", "temperature": 0.0}
-    with cfg_path.open("rb") as fh:
+@lru_cache(maxsize=4)
+def _read_openai_config(path: str, mtime_ns: int) -> Dict[str, Any]:
+    # mtime_ns는 캐시 키 용도: 파일이 바뀌면 다시 파싱
+    with open(path, "rb") as fh:
         cfg = tomllib.load(fh)
     section = cfg.get("cas_codegen") or cfg.get("default", {})
     default = cfg.get("default", {})
@@ -60,27 +66,51 @@ def _load_openai_config() -> Dict[str, Any]:
     return {"model": model, "temperature": float(temperature)}
 
 
-def _encode_image(path: Path) -> Optional[Dict[str, str]]:
-    """이미지를 base64로 인코딩하여 OpenAI API에 전송할 수 있는 형태로 변환"""
-    if not path.exists():
-        return None
-    mime = "image/jpeg"
-    ext = path.suffix.lower()
-    if ext == ".png":
-        mime = "image/png"
+def _load_openai_config() -> Dict[str, Any]:
+    """openai.toml 모델 설정 (파일 mtime이 같으면 파싱 결과 재사용)"""
+    cfg_path = CONFIG_DIR / "openai.toml"
     try:
-        data = base64.b64encode(path.read_bytes()).decode("utf-8")
+        mtime_ns = os.stat(cfg_path).st_mtime_ns
+    except FileNotFoundError:
+        return {"model": "gpt-4o-mini", "temperature": 0.0}
+    return dict(_read_openai_config(os.fspath(cfg_path), mtime_ns))
+
+
+@lru_cache(maxsize=32)
+def _encode_image_cached(path: str, mtime_ns: int, size: int) -> Optional[Dict[str, Any]]:
+    mime = "image/png" if path.lower().endswith(".png") else "image/jpeg"
+    try:
+        with open(path, "rb") as fh:
+            data = base64.b64encode(fh.read()).decode("utf-8")
     except Exception:
         return None
     return {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{data}"}}
 
 
-def _find_crop_images(problem_dir: Path) -> List[Path]:
-    """crop된 이미지 파일들을 찾아서 반환"""
-    crop_images = []
-    for pattern in ["*__pic_i*.jpg", "*__pic_i*.png", "*__pic_i*.jpeg"]:
-        crop_images.extend(sorted(problem_dir.glob(pattern)))
-    return crop_images
+def _encode_image(path: Path) -> Optional[Dict[str, str]]:
+    """이미지를 base64로 인코딩하여 OpenAI API에 전송할 수 있는 형태로 변환 (경로/mtime/크기가 같으면 재사용)"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return _encode_image_cached(os.fspath(path), st.st_mtime_ns, st.st_size)
+
+
+def prefetch_codegen_inputs(problem_dir: str | Path) -> None:
+    """D 단계 결과와 무관한 입력(OCR JSON, 문제/크롭 이미지 base64)을 미리 읽어 캐시에 올림
+
+    e2e가 D 단계를 실행하는 동안 별도 스레드에서 호출해 E 단계 준비 시간을 겹치게 함.
+    """
+    problem_dir_path = Path(problem_dir).expanduser().resolve()
+    ocr_json_path = problem_dir_path / "problem.json"
+    if ocr_json_path.exists():
+        load_ocr_json(ocr_json_path)
+    images: List[Path] = []
+    image_candidate = _select_problem_image(problem_dir_path)
+    if image_candidate:
+        images.append(image_candidate)
+    images.extend(find_crop_images(problem_dir_path))
+    _gather_image_parts(images)
 
 
 def _select_problem_image(problem_dir: Path) -> Optional[Path]:
@@ -92,39 +122,43 @@ def _select_problem_image(problem_dir: Path) -> Optional[Path]:
     return None
 
 
-def _has_pictures_in_ocr(problem_dir: Path) -> bool:
-    """OCR 결과에서 Picture가 있는지 확인"""
-    ocr_path = problem_dir / "problem.json"
-    if not ocr_path.exists():
-        return False
-    
-    try:
-        with ocr_path.open("r", encoding="utf-8") as f:
-            ocr_data = json.load(f)
-        
-        if isinstance(ocr_data, list):
-            return any(item.get("category") == "Picture" for item in ocr_data)
-        return False
-    except Exception:
-        return False
+_CAS_MARK = "---CAS-JOBS---"
+
+
+def _find_cas_section(content: str) -> Optional[tuple[int, str]]:
+    """``---CAS-JOBS---\\s*\\n(.*?)(?=\\n---|\\Z)``의 (마커 위치, 섹션 본문)을 str.find로 계산 (본문 앞 공백 차이는 strip으로 동일)
+
+    마커 뒤 공백에 줄바꿈이 없으면 다음 마커를 찾음 (정규식 search와 동일). 본문은 다음 ``\\n---`` 또는 끝까지.
+    """
+    n = len(content)
+    pos = content.find(_CAS_MARK)
+    while pos != -1:
+        start = pos + len(_CAS_MARK)
+        ws_end = start
+        while ws_end < n and content[ws_end].isspace():
+            ws_end += 1
+        if content.find("\n", start, ws_end) != -1:
+            end = content.find("\n---", ws_end)
+            return pos, content[ws_end : end if end != -1 else n]
+        pos = content.find(_CAS_MARK, pos + 1)
+    return None
 
 
 def extract_jobs_and_code(content: str) -> tuple[List[Dict[str, Any]], str]:
     """---CAS-JOBS--- 섹션을 추출하여 CAS 작업과 Manim 코드를 분리"""
     # ---CAS-JOBS--- 섹션 찾기
-    cas_section_pattern = r"---CAS-JOBS---\s*\n(.*?)(?=\n---|\Z)"
-    cas_match = re.search(cas_section_pattern, content, re.DOTALL)
+    section = _find_cas_section(content)
     
-    if cas_match:
-        cas_text = cas_match.group(1).strip()
+    if section is not None:
+        cas_text = section[1].strip()
         # 나머지 부분이 Manim 코드
-        manim_code = content[:cas_match.start()].strip()
+        manim_code = content[:section[0]].strip()
         
         try:
-            cas_jobs = json.loads(cas_text)
+            cas_jobs = loads_json(cas_text)
             if not isinstance(cas_jobs, list):
                 cas_jobs = []
-        except json.JSONDecodeError:
+        except ValueError:  # json/orjson JSONDecodeError 모두 ValueError 하위
             cas_jobs = []
     else:
         # CAS 섹션이 없으면 전체를 Manim 코드로 간주
@@ -149,9 +183,13 @@ def _placeholder_output(problem_dir: Path, reason: str) -> CodegenResult:
         "        self.add(Text('Fill in Manim code based on problem').scale(0.6))\n"
     )
 
-    code_path.write_text(placeholder + "\n---CAS-JOBS---\n[]\n", encoding="utf-8")
-    manim_path.write_text(placeholder, encoding="utf-8")
-    jobs_path.write_text("[]\n", encoding="utf-8")
+    write_files(
+        [
+            (code_path, (placeholder + "\n---CAS-JOBS---\n[]\n").encode("utf-8")),
+            (manim_path, placeholder.encode("utf-8")),
+            (jobs_path, b"[]\n"),
+        ]
+    )
 
     return CodegenResult(
         code_path=code_path,
@@ -198,21 +236,23 @@ def run_cas_codegen_for_multiple_results(
         result_files = []
         print(f"[e_cas_codegen] No D_geo_compute directory found at {d_geo_dir}")
     
-    # 모든 결과 파일 로드
+    # 모든 결과 파일 로드 (파일별 로그는 모아서 한 번에 출력)
     geo_results = []
+    log_lines: List[str] = []
     for result_file in result_files:
         try:
             with open(result_file, "r", encoding="utf-8") as f:
                 result_data = json.load(f)
             if result_data.get("status") == "solved":
                 geo_results.append(result_data)
-                print(f"[e_cas_codegen] Loaded {Path(result_file).name}")
+                log_lines.append(f"[e_cas_codegen] Loaded {Path(result_file).name}")
             else:
-                print(f"[e_cas_codegen] Skipped {Path(result_file).name} (status: {result_data.get('status')})")
+                log_lines.append(f"[e_cas_codegen] Skipped {Path(result_file).name} (status: {result_data.get('status')})")
         except Exception as e:
-            print(f"[e_cas_codegen] Failed to load {result_file}: {e}")
+            log_lines.append(f"[e_cas_codegen] Failed to load {result_file}: {e}")
     
-    print(f"[e_cas_codegen] Loaded {len(geo_results)} valid geo results")
+    log_lines.append(f"[e_cas_codegen] Loaded {len(geo_results)} valid geo results")
+    print("\n".join(log_lines))
     
     code_path = problem_dir_path / "codegen_output.py"
     manim_path = problem_dir_path / "manim_draft.py"
@@ -231,10 +271,12 @@ def run_cas_codegen_for_multiple_results(
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             return _placeholder_output(problem_dir_path, "OPENAI_API_KEY not configured").as_dict()
+        from openai import OpenAI
+
         client = OpenAI(api_key=api_key)
 
     # OCR 데이터 로드
-    ocr_data = json.loads(ocr_json_path.read_text(encoding="utf-8"))
+    ocr_data = load_ocr_json(ocr_json_path)
 
     # 이미지 수집 (순서 보장)
     images: List[Path] = []
@@ -242,13 +284,15 @@ def run_cas_codegen_for_multiple_results(
         images.append(image_candidate)
     
     # crop 이미지들을 A_OCR 디렉토리에서 찾기
-    crop_images = _find_crop_images(problem_dir_path)
+    crop_images = find_crop_images(problem_dir_path)
     # 이미지 번호 순으로 정렬 (__pic_i0, __pic_i1, __pic_i2, ...)
     crop_images.sort(key=lambda x: int(x.stem.split("__pic_i")[1]) if "__pic_i" in x.stem else 0)
     images.extend(crop_images)
     
-    print(f"[e_cas_codegen] Image order: {[img.name for img in images]}")
-    print(f"[e_cas_codegen] Geo results order: {[result.get('image_index', i) for i, result in enumerate(geo_results)]}")
+    print(
+        f"[e_cas_codegen] Image order: {[img.name for img in images]}\n"
+        f"[e_cas_codegen] Geo results order: {[result.get('image_index', i) for i, result in enumerate(geo_results)]}"
+    )
 
     # 사용자 메시지 구성 - D 결과 유무에 따른 분기
     if geo_results:
@@ -286,23 +330,21 @@ def run_cas_codegen_for_multiple_results(
     ]
 
     try:
-        response = client.chat.completions.create(
-            model=model_name,
-            temperature=temp,
-            messages=messages,
-        )
+        content = cached_chat_completion(client, model=model_name, temperature=temp, messages=messages, refresh=force)
     except Exception as e:
         return _placeholder_output(problem_dir_path, f"OpenAI API error: {e}").as_dict()
-
-    content = response.choices[0].message.content or ""
     
     # CAS 작업과 Manim 코드 분리
     cas_jobs, manim_code = extract_jobs_and_code(content)
     
     # 파일 저장
-    code_path.write_text(content, encoding="utf-8")
-    manim_path.write_text(manim_code, encoding="utf-8")
-    jobs_path.write_text(json.dumps(cas_jobs, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_files(
+        [
+            (code_path, content.encode("utf-8")),
+            (manim_path, manim_code.encode("utf-8")),
+            (jobs_path, dumps_json(cas_jobs)),
+        ]
+    )
 
     return CodegenResult(
         code_path=code_path,
@@ -347,8 +389,6 @@ def run_cas_codegen(
         if spec.get("status") != "solved":
             spec = None  # 해결되지 않은 spec은 무시
 
-    ocr_data = json.loads(ocr_json_path.read_text(encoding="utf-8"))
-
     code_path = problem_dir_path / "codegen_output.py"
     manim_path = problem_dir_path / "manim_draft.py"
     jobs_path = problem_dir_path / "cas_jobs.json"
@@ -366,16 +406,21 @@ def run_cas_codegen(
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             return _placeholder_output(problem_dir_path, "OPENAI_API_KEY not configured").as_dict()
+        from openai import OpenAI
+
         client = OpenAI(api_key=api_key)
 
+    # OCR 데이터는 재사용 경로에서 쓰이지 않으므로 LLM 호출 직전에 로드
+    ocr_data = load_ocr_json(ocr_json_path)
+
     # 이미지 수집
     images: List[Path] = []
     if image_candidate:
         images.append(image_candidate)
     
     # crop 이미지들 추가 (Picture가 있는 경우)
-    if _has_pictures_in_ocr(problem_dir_path):
-        crop_images = _find_crop_images(problem_dir_path)
+    if has_pictures_in_ocr(problem_dir_path):
+        crop_images = find_crop_images(problem_dir_path)
         images.extend(crop_images)
 
     # 사용자 메시지 구성
@@ -398,26 +443,30 @@ def run_cas_codegen(
     user_parts: List[Dict[str, Any]] = [{"type": "text", "text": "\n\n".join(user_sections)}]
     user_parts.extend(_gather_image_parts(images))
 
-    response = client.chat.completions.create(
+    content = cached_chat_completion(
+        client,
         model=model_name,
+        temperature=temp,
         messages=[
             {"role": "system", "content": load_system_prompt()},
             {"role": "user", "content": user_parts},
         ],
-        temperature=temp,
+        refresh=force,
     )
 
-    content = response.choices[0].message.content or ""
-
     try:
         jobs_raw, manim_code = extract_jobs_and_code(content)
     except Exception as exc:
         placeholder = _placeholder_output(problem_dir_path, f"LLM output parsing failed: {exc}")
         return placeholder.as_dict()
 
-    code_path.write_text(content, encoding="utf-8")
-    manim_path.write_text(manim_code, encoding="utf-8")
-    jobs_path.write_text(json.dumps(jobs_raw, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    write_files(
+        [
+            (code_path, content.encode("utf-8")),
+            (manim_path, manim_code.encode("utf-8")),
+            (jobs_path, dumps_json(jobs_raw) + b"\n"),
+        ]
+    )
 
     return CodegenResult(code_path, manim_path, jobs_path, jobs_raw, manim_code, "generated").as_dict()
 
@@ -2,6 +2,16 @@
 CAS Module
 """
 
-from .compute import run_cas, run_cas_compute, SAFE_FUNCS
+from .compute import run_cas, run_cas_compute
+
+
+def __getattr__(name):
+    # SAFE_FUNCS는 SymPy import를 유발하므로 접근 시점에 지연 로드
+    if name == "SAFE_FUNCS":
+        from .compute import _safe_funcs
+
+        return _safe_funcs()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = ['run_cas', 'run_cas_compute', 'SAFE_FUNCS']
@@ -1,99 +1,249 @@
-from typing import List, Dict, Any
+from __future__ import annotations
+
+from typing import List, Dict, Any, Optional, Tuple
+import hashlib
 import json
+import os
 import re
+import threading
+from functools import lru_cache
 from pathlib import Path
-from sympy import (
-    simplify,
-    latex,
-    Rational,
-    symbols,
-    sin,
-    cos,
-    tan,
-    sqrt,
-    expand,
-    factor,
-    pi,
-    Function,
-    solve,
-)
-from sympy.parsing.sympy_parser import (
-    parse_expr,
-    standard_transformations,
-    implicit_multiplication_application,
-)
+from libs.json_io import dumps_json, loads_json, write_bytes_atomic, write_json_atomic
 from libs.schemas import CASJob, CASResult
 
 
-SAFE_FUNCS = {
-    "simplify": simplify,
-    "Rational": Rational,
-    "symbols": symbols,
-    "sin": sin,
-    "cos": cos,
-    "tan": tan,
-    "sqrt": sqrt,
-    "expand": expand,
-    "factor": factor,
-    "pi": pi,
-}
+# SymPy는 실제로 CAS 작업을 실행할 때만 import (cas_jobs.json이 없거나 비어 있는
+# "skipped" 경로에서는 SymPy import 비용을 치르지 않음)
+_SAFE_FUNC_NAMES = (
+    "simplify",
+    "Rational",
+    "symbols",
+    "sin",
+    "cos",
+    "tan",
+    "sqrt",
+    "expand",
+    "factor",
+    "pi",
+)
+
+
+@lru_cache(maxsize=None)
+def _safe_funcs() -> Dict[str, Any]:
+    import sympy
+
+    return {name: getattr(sympy, name) for name in _SAFE_FUNC_NAMES}
+
+
+# SymPy 결과와 문자열이 완전히 같은 자명한 식: 정수 리터럴, 소문자 한 글자 심볼
+# (대문자 E/I/N/S 등은 SymPy 상수이고, 여러 글자는 암시적 곱셈으로 쪼개지므로 제외)
+_TRIVIAL_INT_RE = re.compile(r"[+-]?(?:0|[1-9][0-9]*)")
+_TRIVIAL_SYMBOL_RE = re.compile(r"[a-z]")
+_TRIVIAL_TASKS = frozenset({"simplify", "expand", "factor"})
+_FUNC_CALL_RE = re.compile(r"([A-Za-z_][A-Za-z0-9_]*)\s*\(")
+
+
+def _trivial_result(job: CASJob, expr_s: str, task: str) -> CASResult | None:
+    """SymPy를 거치지 않아도 되는 작업이면 결과를 바로 반환"""
+    if task in _TRIVIAL_TASKS and _TRIVIAL_INT_RE.fullmatch(expr_s):
+        text = str(int(expr_s))
+        return CASResult(id=job.id, result_tex=text, result_py=text)
+    if (task in _TRIVIAL_TASKS or task == "evaluate") and _TRIVIAL_SYMBOL_RE.fullmatch(expr_s):
+        return CASResult(id=job.id, result_tex=expr_s, result_py=expr_s)
+    return None
+
+
+# 작업 내용(task, 식, 변수, 제약, 가정) -> (result_tex, result_py). 프로세스 안에서는 최근
+# _CAS_CACHE_MAX_ENTRIES개까지 메모리에 두고, CAS_CACHE_PATH(JSON)가 설정된 경우에만 실행 간
+# 재사용을 위해 디스크에도 저장 (CAS_CACHE_BYPASS=1이면 디스크 캐시를 쓰지 않음).
+# 키에 _CAS_CACHE_VERSION과 SymPy 버전을 넣어 _compute_job 변경/SymPy 업그레이드 시 이전 결과를 무시
+_CAS_CACHE_VERSION = 1
+_CAS_CACHE_MAX_ENTRIES = 5000
+_cas_memo: Optional[Dict[str, Tuple[str, str]]] = None
+_cas_memo_path: Optional[Path] = None
+_cas_memo_dirty = False
+_cas_memo_lock = threading.Lock()
+
+
+def _cas_cache_path() -> Optional[Path]:
+    if os.environ.get("CAS_CACHE_BYPASS") == "1":
+        return None
+    path = os.environ.get("CAS_CACHE_PATH")
+    return Path(path).expanduser() if path else None
+
+
+@lru_cache(maxsize=None)
+def _cache_salt() -> str:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        sympy_version = version("sympy")
+    except PackageNotFoundError:
+        sympy_version = "unknown"
+    return f"{_CAS_CACHE_VERSION}:{sympy_version}"
+
+
+def _memo() -> Dict[str, Tuple[str, str]]:
+    """메모리 캐시 (디스크 캐시 경로가 바뀌면 (서버 요청마다 env가 다를 수 있음) 다시 읽음)"""
+    global _cas_memo, _cas_memo_path, _cas_memo_dirty
+    path = _cas_cache_path()
+    with _cas_memo_lock:
+        if _cas_memo is None or path != _cas_memo_path:
+            _cas_memo, _cas_memo_path, _cas_memo_dirty = {}, path, False
+            if path is not None and path.exists():
+                try:
+                    loaded = loads_json(path.read_bytes())
+                    _cas_memo = {key: (tex, py) for key, (tex, py) in loaded.items()}
+                except (OSError, ValueError, TypeError, AttributeError):
+                    _cas_memo = {}
+        return _cas_memo
+
+
+def _memo_get(memo: Dict[str, Tuple[str, str]], key: str) -> Optional[Tuple[str, str]]:
+    with _cas_memo_lock:
+        value = memo.pop(key, None)
+        if value is not None:
+            memo[key] = value  # 최근 사용 항목을 뒤로 (오래된 것부터 제거)
+        return value
+
+
+def _memo_put(memo: Dict[str, Tuple[str, str]], key: str, value: Tuple[str, str]) -> None:
+    global _cas_memo_dirty
+    with _cas_memo_lock:
+        memo.pop(key, None)
+        memo[key] = value
+        while len(memo) > _CAS_CACHE_MAX_ENTRIES:
+            del memo[next(iter(memo))]
+        _cas_memo_dirty = True
+
+
+def _save_memo() -> None:
+    """디스크 캐시가 켜져 있고 새 결과가 있을 때만 갱신"""
+    global _cas_memo_dirty
+    path = _cas_cache_path()
+    with _cas_memo_lock:
+        if not _cas_memo_dirty or _cas_memo is None or path is None or path != _cas_memo_path:
+            return
+        payload = {key: list(value) for key, value in _cas_memo.items()}
+        _cas_memo_dirty = False
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(path, payload)
+    except OSError as e:
+        print(f"[WARN] CAS 캐시 저장 실패: {e}")
+
+
+def _job_key(job: CASJob, expr_s: str, task: str) -> str:
+    payload = json.dumps(
+        [_cache_salt(), task, expr_s, job.variables or [], job.constraints or [], job.assumptions or ""],
+        ensure_ascii=False,
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def __getattr__(name: str) -> Any:
+    # ``SAFE_FUNCS``는 기존 공개 API이므로 접근 시점에 지연 생성
+    if name == "SAFE_FUNCS":
+        return _safe_funcs()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _compute_job(j: CASJob, expr_s: str, task: str) -> CASResult:
+    """SymPy로 작업 하나를 계산 (SymPy import는 캐시 미스가 처음 날 때만 발생)"""
+    from sympy import Function, expand, factor, latex, simplify, solve, symbols
+    from sympy.parsing.sympy_parser import (
+        parse_expr,
+        standard_transformations,
+        implicit_multiplication_application,
+    )
+
+    safe_funcs = _safe_funcs()
+    try:
+        # 허용된 함수만 확인
+        for match in _FUNC_CALL_RE.finditer(expr_s):
+            name = match.group(1)
+            if name not in safe_funcs:
+                raise ValueError(f"function {name} not allowed")
+
+        # 암시적 곱셈 허용 파서
+        transformations = standard_transformations + (
+            implicit_multiplication_application,
+        )
+        expr = parse_expr(expr_s, transformations=transformations, local_dict=safe_funcs)
+
+        # 함수 안전성 체크
+        for f in expr.atoms(Function):
+            name = f.func.__name__
+            if name not in safe_funcs:
+                raise ValueError(f"function {name} not allowed")
+
+        # Task에 따른 분기
+        if task == "simplify":
+            val = simplify(expr)
+        elif task == "expand":
+            val = expand(expr)
+        elif task == "factor":
+            val = factor(expr)
+        elif task == "evaluate":
+            val = expr.evalf()
+        elif task == "solve":
+            if not j.variables:
+                raise ValueError("solve requires 'variables'")
+            vars = [symbols(v) for v in j.variables]
+            val = solve(expr, *vars, dict=True)
+        else:
+            raise ValueError(f"Unsupported task: {task}")
+
+        return CASResult(
+            id=j.id,
+            result_tex=latex(val),
+            result_py=str(val),
+        )
+
+    except Exception as e:
+        import traceback
+        error_detail = (
+            f"CAS error in {j.id}: {e}\nExpression: {expr_s}\nTraceback: {traceback.format_exc()}"
+        )
+        raise ValueError(error_detail)
 
 
 def run_cas(jobs: List[CASJob]) -> List[CASResult]:
-    out: List[CASResult] = []
+    memo = _memo()
+    out: List[Optional[CASResult]] = []
+    misses: List[Tuple[int, CASJob, str, str, str]] = []
+    # 같은 키(task/식/변수/제약/가정)의 작업은 한 번만 계산하고 나머지 id에 결과를 복사
+    duplicates: Dict[str, List[Tuple[int, str]]] = {}
     for j in jobs:
         expr_s = (j.target_expr or "").strip()
-        try:
-            # 허용된 함수만 확인
-            for match in re.finditer(r"([A-Za-z_][A-Za-z0-9_]*)\s*\(", expr_s):
-                name = match.group(1)
-                if name not in SAFE_FUNCS:
-                    raise ValueError(f"function {name} not allowed")
-
-            # 암시적 곱셈 허용 파서
-            transformations = standard_transformations + (
-                implicit_multiplication_application,
-            )
-            expr = parse_expr(expr_s, transformations=transformations, local_dict=SAFE_FUNCS)
-
-            # 함수 안전성 체크
-            for f in expr.atoms(Function):
-                name = f.func.__name__
-                if name not in SAFE_FUNCS:
-                    raise ValueError(f"function {name} not allowed")
-
-            # Task에 따른 분기
-            task = j.task.lower() if j.task else "simplify"
-            if task == "simplify":
-                val = simplify(expr)
-            elif task == "expand":
-                val = expand(expr)
-            elif task == "factor":
-                val = factor(expr)
-            elif task == "evaluate":
-                val = expr.evalf()
-            elif task == "solve":
-                if not j.variables:
-                    raise ValueError("solve requires 'variables'")
-                vars = [symbols(v) for v in j.variables]
-                val = solve(expr, *vars, dict=True)
-            else:
-                raise ValueError(f"Unsupported task: {task}")
-
-            out.append(
-                CASResult(
-                    id=j.id,
-                    result_tex=latex(val),
-                    result_py=str(val),
-                )
-            )
-
-        except Exception as e:
-            import traceback
-            error_detail = (
-                f"CAS error in {j.id}: {e}\nExpression: {expr_s}\nTraceback: {traceback.format_exc()}"
-            )
-            raise ValueError(error_detail)
+        task = j.task.lower() if j.task else "simplify"
+        trivial = _trivial_result(j, expr_s, task)
+        if trivial is not None:
+            out.append(trivial)
+            continue
+        key = _job_key(j, expr_s, task)
+        cached = _memo_get(memo, key)
+        if cached is not None:
+            out.append(CASResult(id=j.id, result_tex=cached[0], result_py=cached[1]))
+            continue
+        if key in duplicates:
+            duplicates[key].append((len(out), j.id))
+        else:
+            duplicates[key] = []
+            misses.append((len(out), j, expr_s, task, key))
+        out.append(None)
+
+    if not misses:
+        return out
+
+    # 현재 프로세스에서 순차 실행: 프로세스 풀은 워커마다 SymPy import(수백 ms)를 다시 하고,
+    # 서버 스레드 풀에서 fork하면 교착 위험이 있어 사용하지 않음 (작업 하나는 보통 수 ms)
+    for idx, j, expr_s, task, key in misses:
+        result = _compute_job(j, expr_s, task)
+        _memo_put(memo, key, (result.result_tex, result.result_py))
+        out[idx] = result
+        for dup_idx, dup_id in duplicates[key]:
+            out[dup_idx] = result.model_copy(update={"id": dup_id})
 
     return out
 
@@ -109,6 +259,12 @@ def _coerce_jobs(raw_jobs: List[Dict[str, Any]]) -> List[CASJob]:
     return jobs
 
 
+def trusted_marker_path(output_path: str | Path) -> Path:
+    """``run_cas_compute``가 직접 쓴 결과 파일의 sha256을 기록하는 옆 파일 경로"""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + ".trusted")
+
+
 def run_cas_compute(
     problem_dir: str | Path,
     *,
@@ -123,20 +279,25 @@ def run_cas_compute(
     output_path = Path(output_path or (problem_dir_path / "cas_results.json"))
 
     if not cas_jobs_path.exists():
-        output_path.write_text("[]\n", encoding="utf-8")
+        write_bytes_atomic(output_path, b"[]\n")
         return {"path": str(output_path), "results": [], "status": "skipped"}
 
     raw = json.loads(cas_jobs_path.read_text(encoding="utf-8"))
     jobs = _coerce_jobs(raw)
     if not jobs:
-        output_path.write_text("[]\n", encoding="utf-8")
+        write_bytes_atomic(output_path, b"[]\n")
         return {"path": str(output_path), "results": [], "status": "skipped"}
 
     results = run_cas(jobs)
+    _save_memo()
     data = [r.model_dump() for r in results]
 
     if output_path.exists() and not overwrite:
         raise FileExistsError(f"refusing to overwrite existing file: {output_path}")
 
-    output_path.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    # 검증된 CASResult에서 만든 내용임을 해시로 기록 (G 단계가 재검증 없이 읽을 수 있도록).
+    # 결과 파일을 먼저 교체하므로 중간에 중단되면 해시가 맞지 않아 검증 경로로 읽힘
+    payload = dumps_json(data) + b"\n"
+    write_bytes_atomic(output_path, payload)
+    write_bytes_atomic(trusted_marker_path(output_path), hashlib.sha256(payload).hexdigest().encode("ascii"))
     return {"path": str(output_path), "results": data, "status": "computed"}
@@ -8,8 +8,22 @@ from typing import Dict, Any, List, Optional
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from libs.json_io import dumps_json, write_bytes_atomic
+
 load_dotenv()
 
+_CAS_JOBS_RE = re.compile(r"(---CAS-JOBS---\s*\n)(.*?)(?=\n---|\Z)", re.DOTALL)
+
+_CLIENT: Optional[OpenAI] = None
+
+
+def _client() -> OpenAI:
+    """재시도마다 새 연결 풀을 만들지 않도록 OpenAI 클라이언트를 재사용"""
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=30.0, max_retries=2)
+    return _CLIENT
+
 
 def fix_cas_jobs_with_gpt(cas_jobs: List[Dict[str, Any]], error_msg: str) -> Optional[List[Dict[str, Any]]]:
     """Fix cas_jobs.json format errors using GPT."""
@@ -22,8 +36,7 @@ def fix_cas_jobs_with_gpt(cas_jobs: List[Dict[str, Any]], error_msg: str) -> Opt
     system_prompt = prompt_path.read_text(encoding="utf-8") if prompt_path.exists() else "Fix JSON format errors only."
     
     try:
-        client = OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
+        response = _client().chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -51,20 +64,19 @@ def retry_with_fix(problem_dir: Path, cas_jobs_path: Path, output_path: Path, er
     if not fixed_jobs:
         return {"status": "error", "error": "GPT fix failed"}
     
-    # Save fixed jobs
-    with cas_jobs_path.open("w", encoding="utf-8") as f:
-        json.dump(fixed_jobs, f, ensure_ascii=False, indent=2)
+    # Save fixed jobs (직렬화는 한 번만 하고 codegen_output.py 패치에도 재사용)
+    jobs_bytes = dumps_json(fixed_jobs)
+    write_bytes_atomic(cas_jobs_path, jobs_bytes)
+    jobs_text = jobs_bytes.decode("utf-8")
     
     # Update codegen_output.py
     codegen_path = problem_dir / "codegen_output.py"
     if codegen_path.exists():
         content = codegen_path.read_text(encoding="utf-8")
-        pattern = r"(---CAS-JOBS---\s*\n)(.*?)(?=\n---|\Z)"
-        if re.search(pattern, content, re.DOTALL):
-            new_content = re.sub(pattern, r"\1" + json.dumps(fixed_jobs, ensure_ascii=False, indent=2) + "\n", content, flags=re.DOTALL)
-        else:
-            new_content = content + f"\n---CAS-JOBS---\n{json.dumps(fixed_jobs, ensure_ascii=False, indent=2)}\n"
-        codegen_path.write_text(new_content, encoding="utf-8")
+        new_content, n = _CAS_JOBS_RE.subn(lambda m: m.group(1) + jobs_text + "\n", content)
+        if n == 0:
+            new_content = content + f"\n---CAS-JOBS---\n{jobs_text}\n"
+        write_bytes_atomic(codegen_path, new_content.encode("utf-8"))
     
     # Retry
     try:
@@ -1,7 +1,10 @@
-from typing import List
+from typing import Dict, List
 import logging
+import re
 from libs.schemas import CASResult, RenderOutput
 
+_CAS_PH_RE = re.compile(r"\[\[CAS:([^\]]+)\]\]")
+
 
 def fill_placeholders(draft: str, repls: List[CASResult]) -> RenderOutput:
     """Replace CAS placeholders in ``draft`` using ``repls``.
@@ -15,15 +18,26 @@ def fill_placeholders(draft: str, repls: List[CASResult]) -> RenderOutput:
     if "[[CAS:" not in draft:
         return RenderOutput(manim_code_final=draft)
 
-    code = draft
-    seen = set()
+    table: Dict[str, str] = {}
     for r in repls:
-        if r.id in seen:
+        if r.id in table:
             logging.warning(f"duplicate CAS id {r.id}")
             continue
-        seen.add(r.id)
-        code = code.replace(f"[[CAS:{r.id}]]", "{" + r.result_tex + "}")
+        table[r.id] = "{" + r.result_tex + "}"
+
+    missing: List[str] = []
+
+    def _sub(match: re.Match) -> str:
+        value = table.get(match.group(1))
+        if value is None:
+            missing.append(match.group(1))
+            return match.group(0)
+        return value
+
+    # 치환을 한 번의 스캔으로 처리 (결과별 str.replace 반복 대신)
+    code = _CAS_PH_RE.sub(_sub, draft)
+    if missing:
+        raise ValueError(f"Unreplaced CAS placeholder remains: {missing[0]}")
     if "[[CAS:" in code:
         raise ValueError("Unreplaced CAS placeholder remains")
     return RenderOutput(manim_code_final=code)
-
@@ -1,7 +1,47 @@
+import asyncio
+import io
+import json
 import os
-from openai import OpenAI
+import threading
+import time
+import weakref
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import httpx
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
 
+from libs.llm_cache import cache_path, load_cached, store_cached
+
+# SDK 내장 재시도(연결 오류/429/5xx/타임아웃에 지수 백오프 + jitter) 횟수와 요청 타임아웃
+_MAX_RETRIES = 5
+_TIMEOUT_SEC = 60.0
+
+# Batch API 상태 폴링 간격
+_BATCH_POLL_SEC = 30.0
+
+_HTTP_CLIENT: Optional[httpx.Client] = None
+
+def _shared_http_client() -> httpx.Client:
+    """여러 OpenAICompatLLM 인스턴스가 keep-alive 연결 풀을 공유 (TLS 핸드셰이크 재사용)"""
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None:
+        _HTTP_CLIENT = httpx.Client(
+            limits=httpx.Limits(max_keepalive_connections=32),
+            timeout=_TIMEOUT_SEC,
+        )
+    return _HTTP_CLIENT
+
+@lru_cache(maxsize=8)
+def _read_system_prompt(path: str) -> str:
+    """문제마다 LLM을 새로 만들어도 프롬프트 파일은 한 번만 읽음"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"System prompt file not found: {path}") from None
+
 class OpenAICompatLLM:
     def __init__(self, base_url: str = None, api_key: str = None, model: str = None,
                  system_prompt_path=None, temperature: float = 0.2):
@@ -9,33 +49,174 @@ class OpenAICompatLLM:
         load_dotenv()
         
         # 기본값 설정 (다른 모듈들과 동일)
-        self.client = OpenAI(api_key=api_key or os.environ.get("OPENAI_API_KEY", ""))
+        self.client = OpenAI(
+            api_key=api_key or os.environ.get("OPENAI_API_KEY", ""),
+            http_client=_shared_http_client(),
+            max_retries=_MAX_RETRIES,
+            timeout=_TIMEOUT_SEC,
+        )
+        # 여러 문제를 동시에 후처리할 때 사용하는 비동기 클라이언트 (이벤트 루프별로 생성)
+        # 인스턴스는 스레드 간에 공유되므로 (stages._get_postproc_llm) 루프를 키로 따로 보관
+        self._api_key = api_key or os.environ.get("OPENAI_API_KEY", "")
+        self._aclients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+        self._aclients_lock = threading.Lock()
         self.model = model or "gpt-4o-mini"
         self.temperature = temperature
 
         if system_prompt_path is None:
             here = os.path.dirname(__file__)
             system_prompt_path = os.path.join(here, "postproc_prompt.md")
-        if not os.path.exists(system_prompt_path):
-            raise FileNotFoundError(f"System prompt file not found: {system_prompt_path}")
+        self.system = _read_system_prompt(system_prompt_path)
 
-        with open(system_prompt_path, "r", encoding="utf-8") as f:
-            self.system = f.read()
+    def _async_client(self) -> AsyncOpenAI:
+        # AsyncOpenAI의 연결 풀은 생성된 이벤트 루프에 묶이므로 asyncio.run(루프)마다 따로 만듦
+        loop = asyncio.get_running_loop()
+        with self._aclients_lock:
+            client = self._aclients.get(loop)
+            if client is None:
+                client = AsyncOpenAI(api_key=self._api_key, max_retries=_MAX_RETRIES, timeout=_TIMEOUT_SEC)
+                self._aclients[loop] = client
+        return client
 
-    def propose_patch(self, code: str, error_log: str = "") -> str:
+    async def aclose(self) -> None:
+        """현재 이벤트 루프에서 만든 비동기 클라이언트를 닫음 (asyncio.run이 끝나기 전에 호출)"""
+        with self._aclients_lock:
+            client = self._aclients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    def _user_blocks(self, code: str, error_log: str) -> list:
+        # 코드 블록을 먼저, 에러 로그를 마지막 메시지로 보내 [SYSTEM][CODE] 접두부가
+        # 바이트 단위로 동일하게 유지되도록 함 (OpenAI 자동 prompt caching 적중)
+        blocks = [f"[CODE]\n{code}\n"]
         if error_log:
             # 두 번째 호출: 에러 로그가 있을 때
-            user = f"[ERROR LOG]\n{error_log}\n\n[CODE]\n{code}\n"
-        else:
-            # 첫 번째 호출: 에러 로그 없이 코드만
-            user = f"[CODE]\n{code}\n"
-        
-        res = self.client.chat.completions.create(
+            blocks.append(f"[ERROR LOG]\n{error_log}\n")
+        return blocks
+
+    def _messages(self, blocks: list) -> list:
+        return [{"role": "system", "content": self.system}] + [
+            {"role": "user", "content": block} for block in blocks
+        ]
+
+    def _cache_lookup(self, blocks: list):
+        """(캐시 경로, 저장된 응답) 반환. 캐시를 쓰지 않으면 (None, None)
+
+        공용 LLM 캐시(libs.llm_cache)의 규칙을 따르고 (LLM_CACHE_DIR 설정 시에만, temperature > 0은
+        LLM_CACHE_MODE=best_effort일 때만), 에러 로그가 붙은 재시도/수정 요청은 캐시하지 않음
+        (같은 실패 패치를 다시 받아 루프가 멈추지 않도록)
+        """
+        if len(blocks) > 1:
+            return None, None
+        path = cache_path(self.model, self.temperature, self._messages(blocks))
+        return path, load_cached(path)
+
+    def propose_patch_stream(self, code: str, error_log: str = "") -> Iterator[str]:
+        """응답 토큰을 도착하는 대로 yield (캐시 적중 시 전체 응답을 한 번에)"""
+        blocks = self._user_blocks(code, error_log)
+        cache_file, cached = self._cache_lookup(blocks)
+        if cached is not None:
+            yield cached
+            return
+
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            temperature=self.temperature,
+            messages=self._messages(blocks),
+            stream=True,
+        )
+        parts = []
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+        store_cached(cache_file, "".join(parts).strip())
+
+    async def apropose_patch_stream(self, code: str, error_log: str = "") -> AsyncIterator[str]:
+        """propose_patch_stream의 비동기 버전"""
+        blocks = self._user_blocks(code, error_log)
+        cache_file, cached = self._cache_lookup(blocks)
+        if cached is not None:
+            yield cached
+            return
+
+        stream = await self._async_client().chat.completions.create(
             model=self.model,
             temperature=self.temperature,
-            messages=[
-                {"role": "system", "content": self.system},
-                {"role": "user", "content": user},
-            ],
+            messages=self._messages(blocks),
+            stream=True,
         )
-        return res.choices[0].message.content.strip()
+        parts = []
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+        store_cached(cache_file, "".join(parts).strip())
+
+    def propose_patch(self, code: str, error_log: str = "") -> str:
+        return "".join(self.propose_patch_stream(code, error_log)).strip()
+
+    async def apropose_patch(self, code: str, error_log: str = "") -> str:
+        """propose_patch의 비동기 버전 (이벤트 루프를 막지 않음)"""
+        parts = [chunk async for chunk in self.apropose_patch_stream(code, error_log)]
+        return "".join(parts).strip()
+
+    def propose_patches_batch(self, items: List[Tuple[str, str, str]],
+                              poll_interval: float = _BATCH_POLL_SEC) -> Dict[str, str]:
+        """
+        여러 문제의 수정 요청을 OpenAI Batch API로 한 번에 제출 (비용 50%, 동기 rate limit 우회).
+        items: [(name, code, error_log), ...]  →  {name: 수정된 코드}
+        완료될 때까지 폴링하며, 실패한 항목은 결과에서 빠지므로 호출부가 개별 호출로 처리.
+        """
+        results: Dict[str, str] = {}
+        cache_files: Dict[str, Optional[Path]] = {}
+        lines = []
+        for name, code, error_log in items:
+            blocks = self._user_blocks(code, error_log)
+            cache_file, cached = self._cache_lookup(blocks)
+            if cached is not None:
+                results[name] = cached
+                continue
+            cache_files[name] = cache_file
+            lines.append(json.dumps({
+                "custom_id": name,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "temperature": self.temperature,
+                    "messages": self._messages(blocks),
+                },
+            }, ensure_ascii=False))
+        if not lines:
+            return results
+
+        payload = ("\n".join(lines) + "\n").encode("utf-8")
+        batch_file = self.client.files.create(file=("postproc_batch.jsonl", io.BytesIO(payload)), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(poll_interval)
+            batch = self.client.batches.retrieve(batch.id)
+        if batch.status != "completed" or not batch.output_file_id:
+            print(f"[WARN] Batch {batch.id} 종료 상태: {batch.status}")
+            return results
+
+        output = self.client.files.content(batch.output_file_id).text
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            response = row.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            name = row["custom_id"]
+            patched = (response["body"]["choices"][0]["message"]["content"] or "").strip()
+            results[name] = patched
+            store_cached(cache_files.get(name), patched)
+        return results
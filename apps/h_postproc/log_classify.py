@@ -0,0 +1,76 @@
+# manion_postproc/log_classify.py
+"""
+Manim 렌더 로그를 에러 종류별로 분류하고, 결정적으로 고칠 수 있는 경우엔 LLM 없이 패치.
+모든 패턴을 named group 하나의 정규식으로 합쳐 로그를 한 번만 스캔함.
+"""
+import ast
+import re
+from typing import List, Optional
+
+# (종류, 패턴) — 역참조/중첩 반복 없는 단순 패턴만 사용
+_PATTERNS = (
+    ("syntax", r"SyntaxError:|IndentationError:"),
+    ("missing_numpy", r"NameError: name 'np' is not defined"),
+    ("name_error", r"NameError: name '\w+' is not defined"),
+    ("latex", r"LaTeX compilation error|latex error converting to dvi|! LaTeX Error"),
+    ("attribute_error", r"AttributeError:"),
+    ("type_error", r"TypeError:"),
+)
+_CLASSIFY_RE = re.compile("|".join(f"(?P<{kind}>{pat})" for kind, pat in _PATTERNS))
+
+_MANIM_IMPORT_RE = re.compile(r"^\s*from\s+manim\s+import\s+\*", re.M)
+_NUMPY_IMPORT_RE = re.compile(r"^\s*import\s+numpy\s+as\s+np\b", re.M)
+
+def classify(logs: str) -> List[str]:
+    """로그에 나타난 에러 종류 목록 (처음 나타난 순서, 중복 없음)"""
+    kinds = []
+    for m in _CLASSIFY_RE.finditer(logs):
+        if m.lastgroup not in kinds:
+            kinds.append(m.lastgroup)
+    return kinds
+
+_CODING_RE = re.compile(r"^[ \t\f]*#.*?coding[:=]")
+
+def _import_insert_line(code: str) -> int:
+    """import를 넣을 줄 번호(0부터): 모듈 docstring과 `from __future__ import` 뒤,
+    파싱할 수 없으면 shebang/인코딩 선언 주석 뒤"""
+    try:
+        body = ast.parse(code).body
+    except SyntaxError:
+        body = None
+    if body is not None:
+        end = 0
+        for i, node in enumerate(body):
+            is_docstring = (i == 0 and isinstance(node, ast.Expr)
+                            and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str))
+            is_future = isinstance(node, ast.ImportFrom) and node.module == "__future__"
+            if not (is_docstring or is_future):
+                break
+            end = node.end_lineno
+        if end:
+            return end
+    lines = code.splitlines()
+    n = 0
+    while n < min(len(lines), 2) and (lines[n].startswith("#!") or _CODING_RE.match(lines[n])):
+        n += 1
+    return n
+
+def _insert_imports(code: str, imports: List[str]) -> str:
+    lines = code.splitlines(keepends=True)
+    at = _import_insert_line(code)
+    if at and at <= len(lines) and not lines[at - 1].endswith("\n"):
+        lines[at - 1] += "\n"
+    return "".join(lines[:at] + [line + "\n" for line in imports] + lines[at:])
+
+def rule_patch(code: str, logs: str) -> Optional[str]:
+    """규칙 기반 수정. 적용할 규칙이 없으면 None (→ LLM으로 넘김)"""
+    kinds = classify(logs)
+    imports = []
+    if "name_error" in kinds and not _MANIM_IMPORT_RE.search(code):
+        imports.append("from manim import *")
+    if "missing_numpy" in kinds and not _NUMPY_IMPORT_RE.search(code):
+        imports.append("import numpy as np")
+    if not imports:
+        return None
+    # from __future__ import와 모듈 docstring보다 앞에 두면 SyntaxError/docstring 손실이 생기므로 그 뒤에 삽입
+    return _insert_imports(code, imports)
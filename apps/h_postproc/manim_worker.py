@@ -0,0 +1,65 @@
+# manion_postproc/manim_worker.py
+"""
+stdin으로 렌더 요청(JSON 한 줄)을 받아 같은 인터프리터에서 반복 렌더링하는 워커.
+manim import 비용(1~3초)을 프로세스 시작 시 한 번만 지불함.
+
+요청: {"path": scene.py 경로, "quality": "-ql" 등, "cwd": 작업 디렉토리, "output_file": mp4 경로}
+응답: REPLY_PREFIX + {"ok": bool, "logs": str}
+"""
+import contextlib, importlib.util, io, json, os, sys, traceback
+
+REPLY_PREFIX = "@@MANIM_WORKER@@ "
+
+_QUALITY = {
+    "-ql": "low_quality",
+    "-qm": "medium_quality",
+    "-qh": "high_quality",
+    "-qp": "production_quality",
+    "-qk": "fourk_quality",
+}
+
+def _render(req: dict, seq: int):
+    from manim import Scene, config, tempconfig
+
+    os.chdir(req["cwd"])
+    # scene 파일의 모듈 레벨 config 변경은 tempconfig 종료 시 원복됨
+    with tempconfig({}):
+        config.quality = _QUALITY.get(req.get("quality"), "low_quality")
+        if req.get("output_file"):
+            config.output_file = req["output_file"]
+
+        spec = importlib.util.spec_from_file_location(f"_manion_scene_{seq}", req["path"])
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        scenes = [
+            obj for obj in vars(module).values()
+            if isinstance(obj, type) and issubclass(obj, Scene) and obj.__module__ == module.__name__
+        ]
+        if not scenes:
+            raise RuntimeError(f"No Scene subclass found in {req['path']}")
+        for scene_cls in scenes:
+            scene_cls().render()
+
+def main():
+    import manim  # noqa: F401  (시작 시 미리 import)
+
+    reply_out = sys.stdout
+    for seq, line in enumerate(sys.stdin):
+        line = line.strip()
+        if not line:
+            continue
+        req = json.loads(line)
+        buf = io.StringIO()
+        with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+            try:
+                _render(req, seq)
+                ok = True
+            except (Exception, SystemExit):
+                traceback.print_exc()
+                ok = False
+        reply_out.write(REPLY_PREFIX + json.dumps({"ok": ok, "logs": buf.getvalue()}) + "\n")
+        reply_out.flush()
+
+if __name__ == "__main__":
+    main()
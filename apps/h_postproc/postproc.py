@@ -1,19 +1,181 @@
 # manion_postproc/postproc.py
-import os, json
+import ast, asyncio, hashlib, os, re
 from dataclasses import dataclass
-from .run_manim import run_manim_once
+from typing import Dict, Iterable, List, Optional
+from libs.json_io import write_bytes_atomic, write_json_atomic
+from .log_classify import classify, rule_patch
+from .run_manim import ManimWorker, run_manim_once_async, start_manim_detached
 
 @dataclass
 class Config:
     max_loops: int = 3
     manim_quality: str = "-ql"
     timeout_sec: int = 30
+    hq_async: bool = True  # True면 -qh 렌더를 백그라운드로 띄우고 -ql 영상으로 먼저 반환
+
+async def _propose(llm, code: str, error_log: str) -> str:
+    """비동기 LLM이면 apropose_patch, 아니면 동기 propose_patch를 스레드에서 실행"""
+    if hasattr(llm, "apropose_patch"):
+        return await llm.apropose_patch(code, error_log=error_log)
+    return await asyncio.to_thread(llm.propose_patch, code, error_log)
+
+async def _propose_to_file(llm, code: str, error_log: str, path: str) -> str:
+    """LLM 응답을 스트리밍으로 받아 path에 바로 쓰고, 최종 코드를 반환"""
+    if not hasattr(llm, "apropose_patch_stream"):
+        patched = await _propose(llm, code, error_log)
+        await asyncio.to_thread(_write_text, path, patched)
+        return patched
+
+    # 스트리밍은 임시 파일에 쓰고 완료 후 교체 (중단돼도 이전 코드 파일이 남음)
+    parts = []
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        async for chunk in llm.apropose_patch_stream(code, error_log=error_log):
+            parts.append(chunk)
+            f.write(chunk)
+    raw = "".join(parts)
+    patched = raw.strip()
+    if patched != raw:
+        _write_text(path, patched)  # 같은 .tmp 경로를 덮어쓰고 교체
+    else:
+        os.replace(tmp, path)
+    return patched
+
+def _syntax_error(code: str):
+    """렌더 전 문법 검사. 문제가 있으면 에러 로그 문자열, 없으면 None"""
+    try:
+        compile(code, "<llm>", "exec")
+    except SyntaxError as e:
+        return f"SyntaxError: {e.msg} (line {e.lineno})\n{(e.text or '').rstrip()}"
+    return None
+
+_TRACE_RE = re.compile(r"Traceback \(most recent call last\)")
+# LLM에 보내는 에러 로그 상한 (TeX/폰트 경고, 진행 바로 수십 kB가 되는 경우 대비)
+_MAX_LOG_CHARS = 4000
+_TRACE_CONTEXT_LINES = 5
+
+def _trim_log(logs: str) -> str:
+    """마지막 traceback과 그 앞 몇 줄만 남기고 _MAX_LOG_CHARS로 자름 (끝부분 유지)"""
+    last = None
+    for last in _TRACE_RE.finditer(logs):
+        pass
+    if last is not None:
+        start = logs.rfind("\n", 0, last.start()) + 1
+        for _ in range(_TRACE_CONTEXT_LINES):
+            if start == 0:
+                break
+            start = logs.rfind("\n", 0, start - 1) + 1
+        logs = logs[start:]
+    return logs[-_MAX_LOG_CHARS:]
+
+# postproc_prompt.md가 최초 수정에서 보장하는 전역 설정 / import / LaTeX 템플릿
+_REQUIRED_CONFIG = {"pixel_width", "pixel_height", "frame_width", "frame_height"}
+_REQUIRED_TEMPLATE_ATTRS = {"tex_compiler": "xelatex", "output_format": ".xdv"}
+_REQUIRED_PREAMBLE = (r"\usepackage{xeCJK}", r"\setCJKmainfont")
+
+def _has_required_imports(tree: ast.Module) -> bool:
+    """`from manim import *`와 `import math, numpy as np`가 모듈 최상위에 있는지"""
+    star = math_ok = np_ok = False
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.module == "manim":
+            star = star or any(a.name == "*" for a in node.names)
+        elif isinstance(node, ast.Import):
+            for a in node.names:
+                math_ok = math_ok or (a.name == "math" and a.asname is None)
+                np_ok = np_ok or (a.name == "numpy" and a.asname == "np")
+    return star and math_ok and np_ok
+
+def _has_required_globals(tree: ast.Module) -> bool:
+    """첫 클래스(Scene) 정의 전에 config 전역 설정과 xelatex/xeCJK TexTemplate이 있는지"""
+    config_attrs = set()
+    template_attrs = {}
+    has_template = has_preamble = False
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            break
+        if isinstance(node, ast.Assign):
+            value = node.value
+            for t in node.targets:
+                if isinstance(t, ast.Name) and t.id == "template":
+                    has_template = (isinstance(value, ast.Call) and isinstance(value.func, ast.Name)
+                                    and value.func.id == "TexTemplate")
+                elif isinstance(t, ast.Attribute) and isinstance(t.value, ast.Name):
+                    if t.value.id == "config":
+                        config_attrs.add(t.attr)
+                    elif t.value.id == "template" and isinstance(value, ast.Constant):
+                        template_attrs[t.attr] = value.value
+        elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Call):
+            func = node.value.func
+            if (isinstance(func, ast.Attribute) and func.attr == "add_to_preamble"
+                    and isinstance(func.value, ast.Name) and func.value.id == "template"):
+                text = "".join(a.value for a in node.value.args
+                               if isinstance(a, ast.Constant) and isinstance(a.value, str))
+                has_preamble = has_preamble or all(p in text for p in _REQUIRED_PREAMBLE)
+    return (
+        _REQUIRED_CONFIG <= config_attrs
+        and has_template
+        and all(template_attrs.get(k) == v for k, v in _REQUIRED_TEMPLATE_ATTRS.items())
+        and has_preamble
+    )
+
+def _mathtex_ok(tree: ast.Module) -> bool:
+    """모든 MathTex(...)가 tex_template 인자를 갖고 textemplate(...)로 감싸져 있는지"""
+    wrapped = set()
+    calls = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            if node.func.id == "textemplate":
+                wrapped.update(id(a) for a in node.args)
+            elif node.func.id == "MathTex":
+                calls.append(node)
+    return all(
+        id(c) in wrapped and any(kw.arg == "tex_template" for kw in c.keywords)
+        for c in calls
+    )
+
+def _needs_initial_fix(code: str) -> bool:
+    """최초 LLM 수정이 필요한지 로컬에서 판단. 문법이 맞고 postproc_prompt.md가 요구하는 것
+    (`from manim import *`, `import math, numpy as np`, 첫 Scene 전의 config 전역 설정과
+    xelatex/xeCJK TexTemplate, 모든 MathTex의 tex_template 지정과 textemplate(...) 감싸기)이
+    이미 모두 갖춰져 있으면 False."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return True
+    return not (_has_required_imports(tree) and _has_required_globals(tree) and _mathtex_ok(tree))
+
+async def _render(worker: ManimWorker, code: str, quality: str, timeout, output_dir: str):
+    """상주 워커로 렌더링, 워커를 쓸 수 없으면 manim CLI 실행으로 폴백"""
+    result = await worker.render(code, quality=quality, timeout=timeout, output_dir=output_dir)
+    if result is None:
+        return await run_manim_once_async(code, quality=quality, timeout=timeout, output_dir=output_dir)
+    return result
+
+def _read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def _write_text(path: str, text: str) -> None:
+    write_bytes_atomic(path, text.encode("utf-8"))
+
+async def _closing(llm, coro):
+    """coro를 실행한 뒤 이 이벤트 루프에서 만든 LLM 비동기 클라이언트를 닫음 (루프가 닫힌 뒤 남지 않도록)"""
+    try:
+        return await coro
+    finally:
+        if hasattr(llm, "aclose"):
+            await llm.aclose()
 
 def postprocess_and_render(problem_name: str, llm, cfg: Config):
     """
     problem_name: 예) "problem_001"
     ManimcodeOutput/problem_001/problem_001.py 읽기 → LLM 수정 → 렌더링 → 저장
     """
+    return asyncio.run(_closing(llm, postprocess_and_render_async(problem_name, llm, cfg)))
+
+async def postprocess_and_render_async(problem_name: str, llm, cfg: Config, initial_code: Optional[str] = None):
+    """postprocess_and_render의 비동기 구현 (LLM 호출/렌더링 동안 이벤트 루프를 양보)
+    initial_code: Batch API 등으로 미리 받아 둔 최초 수정 결과. 주어지면 최초 LLM 호출을 생략."""
     base_dir = os.path.join("ManimcodeOutput", problem_name)
     os.makedirs(base_dir, exist_ok=True)
 
@@ -23,56 +185,125 @@ def postprocess_and_render(problem_name: str, llm, cfg: Config):
     proof_path = os.path.join(base_dir, "proof.json")
 
     # 1️⃣ 최초 코드 읽기
-    with open(input_path, "r", encoding="utf-8") as f:
-        code = f.read()
+    code = await asyncio.to_thread(_read_text, input_path)
 
     proof = {"problem": problem_name, "steps": []}
 
     # 2️⃣ LLM으로 최초 수정 (G 단계에서 생성된 Manim 코드 수정)
     # 첫 번째 호출: System prompt + Manim 코드만 전달
-    code = llm.propose_patch(code, error_log="")
-    proof["steps"].append({"stage": "initial_llm_fix", "ok": True})
-
-    with open(output_code_path, "w", encoding="utf-8") as f:
-        f.write(code)
-
-    # 3️⃣ 루프 돌며 렌더링 시도
-    for i in range(cfg.max_loops):
-        ok, logs = run_manim_once(
-            code,
-            quality=cfg.manim_quality,
-            timeout=cfg.timeout_sec,
-            output_dir=base_dir
-        )
-        proof["steps"].append({"stage": f"render_{i+1}", "ok": ok, "log_excerpt": logs[-400:]})
-
-        if ok:
-            # 성공하면 고품질 렌더
-            run_manim_once(
-                code, quality="-qh", timeout=cfg.timeout_sec, output_dir=base_dir
-            )
-            scene_path = os.path.join(base_dir, "scene.mp4")
-            if os.path.exists(scene_path):
-                os.rename(scene_path, output_video_path)
-            proof["result"] = "success"
-            _save_proof(proof_path, proof)
-            return output_code_path, output_video_path, proof
-
-        # 실패 시 → 다시 LLM 수정 (두 번째 호출)
-        # System prompt + Manim 코드 + Error log (3개 전달)
-        code = llm.propose_patch(code, error_log=logs)
-        with open(output_code_path, "w", encoding="utf-8") as f:
-            f.write(code)
-
-    proof["result"] = "failed"
+    # 이미 컴파일되고 필수 설정을 갖춘 코드라면 LLM 왕복을 생략하고 바로 렌더링
+    if initial_code is not None:
+        code = initial_code
+        await asyncio.to_thread(_write_text, output_code_path, code)
+        proof["steps"].append({"stage": "initial_llm_fix", "ok": True, "batch": True})
+    elif _needs_initial_fix(code):
+        code = await _propose_to_file(llm, code, "", output_code_path)
+        proof["steps"].append({"stage": "initial_llm_fix", "ok": True})
+    else:
+        await asyncio.to_thread(_write_text, output_code_path, code)
+        proof["steps"].append({"stage": "initial_llm_fix", "ok": True, "skipped": True})
+
+    # 3️⃣ 루프 돌며 렌더링 시도 (문법 오류가 있으면 Manim 실행 없이 바로 LLM에 피드백)
+    # manim 프로세스를 재시도 간에 유지해 매번 import 비용을 내지 않도록 함
+    worker = ManimWorker()
+    seen = set()
+    stuck = False
+    try:
+        for i in range(cfg.max_loops):
+            syntax_error = _syntax_error(code)
+            if syntax_error:
+                ok, logs = False, syntax_error
+            else:
+                ok, logs = await _render(worker, code, cfg.manim_quality, cfg.timeout_sec, base_dir)
+            proof["steps"].append({"stage": f"render_{i+1}", "ok": ok, "log_excerpt": logs[-400:]})
+
+            if ok:
+                scene_path = os.path.join(base_dir, "scene.mp4")
+                if cfg.hq_async:
+                    # -ql 영상을 미리보기로 바로 반환하고, 고품질 렌더가 성공하면 임시 파일에서 같은 경로로 원자적으로 교체
+                    if os.path.exists(scene_path):
+                        os.replace(scene_path, output_video_path)
+                    try:
+                        hq = await asyncio.to_thread(
+                            start_manim_detached, code, "-qh", base_dir, output_video_path
+                        )
+                        proof["hq_pid"] = hq.pid
+                    except OSError as e:
+                        proof["hq_error"] = str(e)
+                else:
+                    # 성공하면 고품질 렌더
+                    await _render(worker, code, "-qh", cfg.timeout_sec, base_dir)
+                    if os.path.exists(scene_path):
+                        os.replace(scene_path, output_video_path)
+                proof["result"] = "success"
+                await asyncio.to_thread(_save_proof, proof_path, proof)
+                return output_code_path, output_video_path, proof
+
+            # 같은 (코드, 에러 로그)가 다시 나오면 LLM이 이전 상태로 되돌아간 것 → 더 돌려도 같은 결과
+            h = hashlib.sha256((code + "\0" + logs).encode("utf-8")).hexdigest()
+            proof["steps"][-1]["hash"] = h[:16]
+            if h in seen:
+                stuck = True
+                break
+            seen.add(h)
+
+            # import 누락처럼 결정적으로 고칠 수 있는 에러는 LLM 호출 없이 규칙으로 수정
+            kinds = classify(logs)
+            proof["steps"][-1]["error_kinds"] = kinds
+            patched = rule_patch(code, logs)
+            if patched is not None:
+                code = patched
+                await asyncio.to_thread(_write_text, output_code_path, code)
+                proof["steps"].append({"stage": f"rule_fix_{i+1}", "ok": True})
+                continue
+
+            # 실패 시 → 다시 LLM 수정 (두 번째 호출)
+            # System prompt + Manim 코드 + Error log (3개 전달, 로그는 축약해서 / proof에는 원본 유지)
+            code = await _propose_to_file(llm, code, _trim_log(logs), output_code_path)
+    finally:
+        await worker.close()
+
+    proof["result"] = "stuck" if stuck else "failed"
     proof["final_error"] = logs[-2000:]
-    _save_proof(proof_path, proof)
+    await asyncio.to_thread(_save_proof, proof_path, proof)
     return output_code_path, None, proof
 
+async def _batch_initial_fixes(problem_names: List[str], llm) -> Dict[str, str]:
+    """최초 수정이 필요한 문제들을 Batch API 한 번으로 처리. {problem_name: 수정된 코드}"""
+    items = []
+    for name in problem_names:
+        code = await asyncio.to_thread(_read_text, os.path.join("ManimcodeOutput", name, f"{name}.py"))
+        if _needs_initial_fix(code):
+            items.append((name, code, ""))
+    if not items:
+        return {}
+    return await asyncio.to_thread(llm.propose_patches_batch, items)
+
+async def postprocess_many_async(problem_names: Iterable[str], llm, cfg: Config, max_concurrency: int = 8,
+                                 batch: bool = False) -> List:
+    """여러 문제를 최대 max_concurrency개까지 동시에 후처리. 실패한 문제는 예외 객체로 반환
+    batch=True면 최초 수정을 Batch API로 모아서 처리 (지연은 크지만 비용이 절반인 오프라인 재실행용).
+    Batch에서 빠진 문제는 기존처럼 개별 호출로 처리됨."""
+    problem_names = list(problem_names)
+    initial: Dict[str, str] = {}
+    if batch and hasattr(llm, "propose_patches_batch"):
+        initial = await _batch_initial_fixes(problem_names, llm)
+
+    sem = asyncio.Semaphore(max_concurrency)
+
+    async def _one(name: str):
+        async with sem:
+            return await postprocess_and_render_async(name, llm, cfg, initial_code=initial.get(name))
+
+    return await asyncio.gather(*(_one(n) for n in problem_names), return_exceptions=True)
+
+def postprocess_many(problem_names: Iterable[str], llm, cfg: Config, max_concurrency: int = 8,
+                     batch: bool = False) -> List:
+    return asyncio.run(_closing(llm, postprocess_many_async(problem_names, llm, cfg, max_concurrency, batch=batch)))
+
 def _save_proof(path: str, data: dict):
     """proof를 JSON으로 저장"""
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        write_json_atomic(path, data)
     except Exception as e:
         print(f"[WARN] proof 저장 실패: {e}")
@@ -1,24 +1,194 @@
 # manion_postproc/run_manim.py
-import subprocess, tempfile, os, shlex
+import asyncio, json, re, subprocess, sys, tempfile, os, uuid
+from pathlib import Path
+from .manim_worker import REPLY_PREFIX
+
+# 렌더 실패가 확정되는 로그 라인 (plain/rich traceback 헤더, 마지막 예외 라인)
+_FATAL_RE = re.compile(r"Traceback \(most recent call last\)|^\w*(?:Error|Exception):")
+# 치명적 라인을 본 뒤 traceback이 끝까지 출력되도록 기다려 주는 시간
+_FATAL_GRACE_SEC = 2.0
 
 def run_manim_once(code: str, quality="-ql", timeout=30, output_dir=None):
     """
     code: 실행할 manim 코드 (string)
     quality: -ql / -qh 등
     output_dir: 결과 영상이 저장될 디렉토리. None이면 manim 기본 경로 사용.
+                지정하면 scene.py와 media/ 캐시(TeX, 폰트 등)를 이 디렉토리에 유지해
+                재시도 간에 재사용함.
+    """
+    return asyncio.run(run_manim_once_async(code, quality=quality, timeout=timeout, output_dir=output_dir))
+
+async def run_manim_once_async(code: str, quality="-ql", timeout=30, output_dir=None):
+    """run_manim_once의 비동기 버전. 로그를 줄 단위로 읽다가 치명적 에러가 보이면
+    timeout까지 기다리지 않고 프로세스를 종료함."""
+    if output_dir is None:
+        with tempfile.TemporaryDirectory() as td:
+            return await _run(code, quality, timeout, script_dir=td, cwd=None, output_file=None)
+    output_dir = os.path.abspath(output_dir)  # cwd를 바꾸므로 경로는 절대경로로
+    os.makedirs(output_dir, exist_ok=True)
+    return await _run(code, quality, timeout, script_dir=output_dir, cwd=output_dir,
+                      output_file=os.path.join(output_dir, "scene.mp4"))
+
+async def _run(code: str, quality: str, timeout, script_dir: str, cwd, output_file):
+    path = os.path.join(script_dir, "scene.py")
+    Path(path).write_text(code, encoding="utf-8")
+
+    # manim CLI command (셸 없이 argv로 직접 실행)
+    cmd = ["manim", quality, path]
+    if output_file:
+        cmd += ["-o", output_file]
+
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, cwd=cwd
+    )
+    out_lines, err_lines = [], []
+    fatal = asyncio.Event()
+
+    async def _pump(stream, sink):
+        async for raw in stream:
+            line = raw.decode("utf-8", errors="replace")
+            sink.append(line)
+            if _FATAL_RE.search(line):
+                fatal.set()
+
+    pumps = asyncio.gather(_pump(proc.stdout, out_lines), _pump(proc.stderr, err_lines))
+    exited = asyncio.ensure_future(proc.wait())
+    fatal_seen = asyncio.ensure_future(fatal.wait())
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        done, _ = await asyncio.wait({exited, fatal_seen}, timeout=timeout,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        if exited not in done and fatal_seen in done:
+            # 실패 확정: traceback 출력이 끝날 시간만 주고 종료
+            grace = max(0.0, min(_FATAL_GRACE_SEC, deadline - loop.time()))
+            await asyncio.wait({exited}, timeout=grace)
+            if not exited.done():
+                proc.kill()
+        elif exited not in done:
+            # subprocess.run(timeout=...)과 동일하게 TimeoutExpired 전파
+            proc.kill()
+            await exited
+            await pumps
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        await exited
+        await pumps
+    finally:
+        fatal_seen.cancel()
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+    ok = (proc.returncode == 0)
+    logs = "".join(out_lines) + "\n" + "".join(err_lines)
+    return ok, logs
+
+# 분리된 렌더 프로세스: manim이 성공하면 임시 영상을 최종 경로로 교체, 실패하면 임시 파일만 정리
+# (argv: 임시 영상, 최종 영상, 임시 scene 스크립트, manim 명령...)
+_HQ_RUNNER = (
+    "import os, subprocess, sys\n"
+    "tmp, final, script = sys.argv[1:4]\n"
+    "try:\n"
+    "    ok = subprocess.call(sys.argv[4:]) == 0 and os.path.exists(tmp)\n"
+    "    if ok:\n"
+    "        os.replace(tmp, final)\n"
+    "finally:\n"
+    "    for p in (tmp, script):\n"
+    "        try:\n"
+    "            os.unlink(p)\n"
+    "        except OSError:\n"
+    "            pass\n"
+)
+
+def start_manim_detached(code: str, quality: str, output_dir: str, output_file: str) -> subprocess.Popen:
     """
-    with tempfile.TemporaryDirectory() as td:
-        path = os.path.join(td, "scene.py")
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(code)
-
-        # manim CLI command
-        cmd = f"manim {quality} {shlex.quote(path)}"
-        if output_dir:
-            os.makedirs(output_dir, exist_ok=True)
-            cmd += f" -o {shlex.quote(os.path.join(output_dir, 'scene.mp4'))}"
-
-        p = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=timeout)
-        ok = (p.returncode == 0)
-        logs = (p.stdout or "") + "\n" + (p.stderr or "")
-        return ok, logs
+    manim 렌더를 백그라운드 프로세스로 시작하고 기다리지 않음 (고품질 렌더를 크리티컬 패스에서 제외).
+    별도 세션으로 띄워 부모 프로세스가 끝나도 계속 진행되며, 로그는 output_dir/hq_render.log에 남김.
+    렌더는 고유한 임시 이름(스크립트/영상)으로 진행하고 성공했을 때만 output_file을 os.replace로 교체하므로,
+    읽는 쪽은 반쯤 쓰인 영상을 보지 않고 동시에 다시 실행해도 서로의 파일을 덮어쓰지 않음.
+    """
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.abspath(output_file)
+    tag = uuid.uuid4().hex[:8]
+    path = os.path.join(output_dir, f"scene_hq_{tag}.py")
+    Path(path).write_text(code, encoding="utf-8")
+    stem, ext = os.path.splitext(output_file)
+    tmp_file = f"{stem}.hq-{tag}{ext or '.mp4'}"
+    with open(os.path.join(output_dir, "hq_render.log"), "wb") as log:
+        return subprocess.Popen(
+            [sys.executable, "-c", _HQ_RUNNER, tmp_file, output_file, path,
+             "manim", quality, path, "-o", tmp_file],
+            cwd=output_dir, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+class ManimWorker:
+    """
+    manim_worker 프로세스 하나를 유지하며 렌더 요청을 순차 처리.
+    첫 렌더만 인터프리터/manim 시작 비용을 내고, 이후 재시도는 바로 렌더링함.
+    워커가 죽으면 render()가 None을 반환하므로 호출부는 run_manim_once_async로 폴백.
+    """
+    _SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "manim_worker.py")
+
+    def __init__(self):
+        self._proc = None
+        self.disabled = False
+
+    async def _ensure(self):
+        if self._proc is None or self._proc.returncode is not None:
+            self._proc = await asyncio.create_subprocess_exec(
+                sys.executable, self._SCRIPT,
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT, limit=1 << 24,
+            )
+        return self._proc
+
+    async def render(self, code: str, quality="-ql", timeout=30, output_dir="."):
+        """(ok, logs) 반환. 워커를 쓸 수 없으면 None"""
+        if self.disabled:
+            return None
+        output_dir = os.path.abspath(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, "scene.py")
+        Path(path).write_text(code, encoding="utf-8")
+        req = {"path": path, "quality": quality, "cwd": output_dir,
+               "output_file": os.path.join(output_dir, "scene.mp4")}
+
+        extra = []
+
+        async def _reply(proc):
+            async for raw in proc.stdout:
+                line = raw.decode("utf-8", errors="replace")
+                if line.startswith(REPLY_PREFIX):
+                    return json.loads(line[len(REPLY_PREFIX):])
+                extra.append(line)
+            return None  # EOF: 워커 비정상 종료
+
+        try:
+            proc = await self._ensure()
+            proc.stdin.write((json.dumps(req) + "\n").encode("utf-8"))
+            await proc.stdin.drain()
+            reply = await asyncio.wait_for(_reply(proc), timeout)
+        except asyncio.TimeoutError:
+            # CLI 경로와 동일하게 TimeoutExpired 전파 (다음 요청은 새 워커로)
+            await self.close()
+            raise subprocess.TimeoutExpired(["manim_worker", quality, path], timeout)
+        except (OSError, ValueError):
+            reply = None
+        if reply is None:
+            self.disabled = True
+            await self.close()
+            return None
+        return reply["ok"], "".join(extra) + reply["logs"]
+
+    async def close(self):
+        proc, self._proc = self._proc, None
+        if proc is None or proc.returncode is not None:
+            return
+        try:
+            proc.stdin.close()
+            await asyncio.wait_for(proc.wait(), 5)
+        except (OSError, asyncio.TimeoutError):
+            proc.kill()
+            await proc.wait()
@@ -0,0 +1,83 @@
+"""JSON serialisation and atomic file writes shared by the pipeline stages."""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Iterable, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    orjson = None
+
+_ORJSON_INDENT = (orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+
+def _default(obj: Any) -> Any:
+    # numpy 배열/스칼라 (d_geo_compute 좌표) 직렬화
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_json(data: Any) -> bytes:
+    """``json.dumps(data, ensure_ascii=False, indent=2)``와 같은 출력을 UTF-8 bytes로 반환"""
+    if orjson is not None:
+        return orjson.dumps(data, option=_ORJSON_INDENT)
+    return json.dumps(data, ensure_ascii=False, indent=2, default=_default).encode("utf-8")
+
+
+def loads_json(data: bytes | str) -> Any:
+    """``json.loads``와 동일 (orjson이 있으면 C 구현으로 파싱)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _write_fd(fd: int, payload: bytes) -> None:
+    view = memoryview(payload)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def write_bytes_atomic(path: str | Path, payload: bytes) -> None:
+    """같은 디렉토리의 임시 파일에 쓴 뒤 ``os.replace``로 교체 (중단 시 부분 파일 방지)
+
+    임시 파일 이름은 ``mkstemp``로 매번 새로 만들므로 같은 경로에 동시에 쓰는 스레드/프로세스끼리 섞이지 않음.
+    """
+    path = os.fspath(path)
+    directory, name = os.path.split(path)
+    fd, tmp = tempfile.mkstemp(dir=directory or ".", prefix=name + ".", suffix=".tmp")
+    try:
+        try:
+            _write_fd(fd, payload)
+        finally:
+            os.close(fd)
+        # mkstemp는 0600으로 만들므로 기존 open()과 같은 권한으로 맞춤
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def write_json_atomic(path: str | Path, data: Any, *, trailing_newline: bool = False) -> None:
+    payload = dumps_json(data)
+    if trailing_newline:
+        payload += b"\n"
+    write_bytes_atomic(path, payload)
+
+
+def write_files(items: Iterable[Tuple[str | Path, bytes]]) -> None:
+    """여러 출력 파일을 파일 객체 생성 없이 ``os.open``/``os.write``로 연달아 기록
+
+    각 파일은 고유한 임시 파일에 쓴 뒤 ``os.replace``로 교체하므로 중단돼도 잘린 파일이 남지 않음.
+    """
+    for path, payload in items:
+        write_bytes_atomic(path, payload)
@@ -0,0 +1,117 @@
+"""Opt-in on-disk memo of chat-completion responses keyed by the exact request.
+
+With ``LLM_CACHE_DIR`` set, an identical request (model, temperature,
+messages including base64 images) returns the stored response instead of
+calling the API again. Stages C and E send deterministic prompts
+(``temperature`` 0 by default); stage H's ``OpenAICompatLLM`` only consults
+the cache for its initial fix, and like every caller is subject to the same
+temperature rule. ``refresh=True`` (stage ``force``) skips the lookup but
+still stores the new response.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from libs.json_io import dumps_json, write_bytes_atomic
+
+# LLM_CACHE_DIR(디렉토리)가 설정된 경우에만 응답을 요청 해시별 파일로 저장, LLM_CACHE_BYPASS=1이면 사용하지 않음.
+# temperature > 0 요청은 응답이 매번 달라질 수 있으므로 LLM_CACHE_MODE=best_effort일 때만 캐시.
+# LLM_CACHE_TTL(초, 기본 7일)이 지난 항목은 무시하고, LLM_CACHE_MAX_ENTRIES(기본 1000)를 넘으면 오래된 것부터 삭제
+_DEFAULT_TTL_SEC = 7 * 24 * 3600
+_DEFAULT_MAX_ENTRIES = 1000
+
+
+def _cache_dir(temperature: float) -> Optional[Path]:
+    if os.environ.get("LLM_CACHE_BYPASS") == "1":
+        return None
+    if temperature and os.environ.get("LLM_CACHE_MODE") != "best_effort":
+        return None
+    root = os.environ.get("LLM_CACHE_DIR")
+    return Path(root).expanduser() if root else None
+
+
+def _ttl() -> float:
+    return float(os.environ.get("LLM_CACHE_TTL", _DEFAULT_TTL_SEC))
+
+
+def _max_entries() -> int:
+    return int(os.environ.get("LLM_CACHE_MAX_ENTRIES", _DEFAULT_MAX_ENTRIES))
+
+
+def request_key(model: str, temperature: float, messages: List[Dict[str, Any]]) -> str:
+    payload = dumps_json({"model": model, "temperature": temperature, "messages": messages})
+    return hashlib.blake2b(payload, digest_size=20).hexdigest()
+
+
+def cache_path(model: str, temperature: float, messages: List[Dict[str, Any]]) -> Optional[Path]:
+    """요청의 캐시 파일 경로 (캐시를 쓰지 않는 설정이면 None)"""
+    # 캐시가 꺼져 있으면 (기본값) 메시지(base64 이미지 포함) 직렬화/해시도 하지 않음
+    cache_dir = _cache_dir(temperature)
+    return cache_dir / f"{request_key(model, temperature, messages)}.txt" if cache_dir else None
+
+
+def load_cached(path: Optional[Path]) -> Optional[str]:
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+        ttl = _ttl()
+        if ttl and time.time() - st.st_mtime > ttl:
+            return None
+        return path.read_bytes().decode("utf-8")
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def _prune(cache_dir: Path) -> None:
+    limit = _max_entries()
+    with os.scandir(cache_dir) as it:
+        entries = [(e.stat().st_mtime, e.path) for e in it if e.name.endswith(".txt") and e.is_file()]
+    if len(entries) <= limit:
+        return
+    entries.sort()
+    for _, path in entries[: len(entries) - limit]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def store_cached(path: Optional[Path], content: str) -> None:
+    if path is None:
+        return
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_bytes_atomic(path, content.encode("utf-8"))
+        _prune(path.parent)
+    except OSError as e:
+        print(f"[WARN] LLM 캐시 저장 실패: {e}")
+
+
+def cached_chat_completion(
+    client: Any,
+    *,
+    model: str,
+    temperature: float,
+    messages: List[Dict[str, Any]],
+    refresh: bool = False,
+) -> str:
+    """``client.chat.completions.create`` 응답 본문을 반환 (같은 요청이면 저장된 응답 재사용)
+
+    ``refresh``면 저장된 응답을 읽지 않고 API를 호출한 뒤 결과로 캐시를 갱신.
+    """
+    path = cache_path(model, temperature, messages)
+    if not refresh:
+        cached = load_cached(path)
+        if cached is not None:
+            return cached
+
+    response = client.chat.completions.create(model=model, temperature=temperature, messages=messages)
+    content = response.choices[0].message.content or ""
+    store_cached(path, content)
+    return content
@@ -1,31 +1,34 @@
 """Manion deterministic pipeline API."""
 
-from .e2e import run_e2e
-from .stages import (
-    Stage,
-    PipelinePaths,
-    run_stage_a,
-    run_stage_b,
-    run_stage_c,
-    run_stage_d,
-    run_stage_e,
-    run_stage_f,
-    run_stage_g,
-    run_stage_h,
-    run_postproc_stage,
-)
+from importlib import import_module
 
-__all__ = [
-    "run_e2e",
-    "Stage",
-    "PipelinePaths",
-    "run_stage_a",
-    "run_stage_b",
-    "run_stage_c",
-    "run_stage_d",
-    "run_stage_e",
-    "run_stage_f",
-    "run_stage_g",
-    "run_stage_h",
-    "run_postproc_stage",
-]
+# 하위 모듈은 속성 접근 시점에 import (``python -m pipelines.cli_stage --help`` 등이
+# 패키지 import만으로 전체 단계 의존성을 불러오지 않도록)
+_EXPORTS = {
+    "run_e2e": ".e2e",
+    "Stage": ".stages",
+    "PipelinePaths": ".stages",
+    "parse_stage": ".stages",
+    "run_stage_a": ".stages",
+    "run_stage_b": ".stages",
+    "run_stage_c": ".stages",
+    "run_stage_d": ".stages",
+    "run_stage_e": ".stages",
+    "run_stage_f": ".stages",
+    "run_stage_g": ".stages",
+    "run_stage_h": ".stages",
+    "run_postproc_stage": ".stages",
+    "run_postproc_stage_many": ".stages",
+}
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+__all__ = list(_EXPORTS)
@@ -5,23 +5,10 @@ from __future__ import annotations
 
 import argparse
 import os
+import sys
 from pathlib import Path
 from pipelines.e2e import run_e2e
-from pipelines.stages import Stage
-
-
-def _parse_stage(value: Optional[str]) -> Optional[Stage]:
-    if value is None:
-        return None
-    value = value.strip().lower()
-    for stage in Stage:
-        if value == stage.value:
-            return stage
-        if value == stage.name.lower():
-            return stage
-        if value == stage.value.split("_")[0]:
-            return stage
-    raise argparse.ArgumentTypeError(f"unknown stage: {value}")
+from pipelines.stages import Stage, parse_stage
 
 
 def _apply_postproc_overrides(args: argparse.Namespace) -> None:
@@ -55,6 +42,7 @@ Examples:
     parser.add_argument("--to-stage", help="Stop after this stage")
     parser.add_argument("--geo", action="store_true", help="Shortcut for --from-stage c_geo_codegen")
     parser.add_argument("--force", action="store_true", help="Re-run stages even if outputs exist")
+    parser.add_argument("--no-cache", action="store_true", help="Do not reuse or store content-hash stage results")
     parser.add_argument("--postproc", action="store_true", help="Force-enable post processing stage")
     parser.add_argument("--no-postproc", action="store_true", help="Disable post processing stage")
 
@@ -62,11 +50,14 @@ Examples:
     _apply_postproc_overrides(args)
 
     start_stage = Stage.C_GEO_CODEGEN if args.geo else Stage.A_OCR
-    if args.from_stage:
-        start_stage = _parse_stage(args.from_stage)
-        if start_stage is None:
-            start_stage = Stage.A_OCR
-    end_stage = _parse_stage(args.to_stage)
+    end_stage = None
+    try:
+        if args.from_stage:
+            start_stage = parse_stage(args.from_stage)
+        if args.to_stage:
+            end_stage = parse_stage(args.to_stage)
+    except ValueError as exc:
+        parser.error(str(exc))
 
     problem_name = args.problem_name
     base_dir = Path(args.base_dir)
@@ -96,13 +87,18 @@ Examples:
         start_stage=start_stage,
         end_stage=end_stage,
         force=args.force,
+        use_cache=not args.no_cache,
     )
 
-    print(f"\n✅ Pipeline completed. Outputs stored in {result['problem_dir']}")
+    # 요약은 한 번에 출력 (stdout이 파이프일 때 줄마다 write하지 않도록)
+    lines = [f"\n✅ Pipeline completed. Outputs stored in {result['problem_dir']}"]
     for entry in result["results"]:
         stage = entry["stage"]
         status = entry["result"].get("status") if isinstance(entry["result"], dict) else "ok"
-        print(f" - {stage}: {status}")
+        cached = " (cached)" if isinstance(entry["result"], dict) and entry["result"].get("cached") else ""
+        lines.append(f" - {stage}: {status}{cached}")
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -4,71 +4,258 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
+import sys
+from functools import lru_cache
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
-from pipelines.stages import (
-    Stage,
-    PipelinePaths,
-    run_stage_a,
-    run_stage_b,
-    run_stage_c,
-    run_stage_d,
-    run_stage_e,
-    run_stage_f,
-    run_stage_g,
-    run_stage_h,
+from libs.json_io import dumps_json
+from pipelines.stages import Stage, PipelinePaths, parse_stage
+
+
+# --serve 시작 시 미리 import해 두는 단계 의존성 (없는 모듈은 건너뜀)
+_PRELOAD_MODULES = (
+    "pipelines.stages",
+    "libs.schemas",
+    "apps.a_ocr.dots_ocr.parser",
+    "apps.a_ocr.tools.picture_ocr_pipeline",
+    "apps.b_graphsampling.builder",
+    "apps.c_geo_codegen",
+    "apps.d_geo_compute",
+    "apps.e_cas_codegen",
+    "apps.f_cas_compute",
+    "apps.g_render",
+    "sympy",
 )
 
+# --client가 넘기는 환경 변수 중 서버 프로세스에 적용하는 것 (요청이 끝나면 원래 값으로 복원)
+_FORWARDED_ENV_PREFIXES = ("LLM_CACHE_", "CAS_CACHE_", "POSTPROC_")
 
-def _parse_stage(value: str) -> Stage:
-    value = value.strip().lower()
-    for stage in Stage:
-        if value == stage.value:
-            return stage
-        if value == stage.name.lower():
-            return stage
-        if value == stage.value.split("_")[0]:
-            return stage
-    raise argparse.ArgumentTypeError(f"unknown stage: {value}")
 
+def _forwarded_env(env: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        key: value
+        for key, value in env.items()
+        if isinstance(key, str) and isinstance(value, str) and key.startswith(_FORWARDED_ENV_PREFIXES)
+    }
 
-def main() -> None:
-    parser = argparse.ArgumentParser(description="Run a single pipeline stage")
+
+@lru_cache(maxsize=None)
+def _build_parser() -> argparse.ArgumentParser:
+    """파서는 한 번만 구성 (--serve 프로세스가 요청마다 다시 만들지 않도록)"""
+    parser = argparse.ArgumentParser(
+        description="Run a single pipeline stage",
+        epilog="--serve SOCKET keeps a warm process on a UNIX socket; "
+        "--client SOCKET forwards this invocation to it (runs in-process if unavailable).",
+    )
     parser.add_argument("stage", help="Stage identifier (e.g. a_ocr, b_graphsampling)")
     parser.add_argument("--problem-name", required=True, help="Problem identifier")
     parser.add_argument("--base-dir", default="ManimcodeOutput", help="Root directory for pipeline outputs")
     parser.add_argument("--image", help="Input image (required for stage a)")
     parser.add_argument("--force", action="store_true", help="Overwrite existing artefacts")
+    return parser
 
-    args = parser.parse_args()
-    stage = _parse_stage(args.stage)
+
+def _run(argv: Optional[List[str]] = None) -> None:
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    try:
+        stage = parse_stage(args.stage)
+    except ValueError as exc:
+        parser.error(str(exc))
 
     base_dir = Path(args.base_dir)
     paths = PipelinePaths(base_dir, args.problem_name)
 
+    # 단계 모듈은 실행할 단계 것만 import (--help/인자 오류 경로는 의존성 import 없이 종료)
     if stage == Stage.A_OCR:
         if not args.image:
             parser.error("--image is required for the OCR stage")
+        from pipelines.stages import run_stage_a
+
         result = run_stage_a(paths, image_path=args.image, overwrite=args.force)
     elif stage == Stage.B_GRAPH:
+        from pipelines.stages import run_stage_b
+
         result = run_stage_b(paths)
     elif stage == Stage.C_GEO_CODEGEN:
+        from pipelines.stages import run_stage_c
+
         result = run_stage_c(paths, overwrite=args.force)
     elif stage == Stage.D_GEO_COMPUTE:
+        from pipelines.stages import run_stage_d
+
         result = run_stage_d(paths, overwrite=args.force)
     elif stage == Stage.E_CAS_CODEGEN:
+        from pipelines.stages import run_stage_e
+
         result = run_stage_e(paths, force=args.force)
     elif stage == Stage.F_CAS_COMPUTE:
+        from pipelines.stages import run_stage_f
+
         result = run_stage_f(paths, overwrite=args.force)
     elif stage == Stage.G_RENDER:
+        from pipelines.stages import run_stage_g
+
         result = run_stage_g(paths)
     elif stage == Stage.H_POSTPROC:
+        from pipelines.stages import run_stage_h
+
         res = run_stage_h(paths)
         result = res if res is not None else {"status": "skipped"}
     else:  # pragma: no cover - defensive
         parser.error(f"Unsupported stage: {stage}")
 
-    print(json.dumps({"stage": stage.value, "result": result}, ensure_ascii=False, indent=2))
+    print(dumps_json({"stage": stage.value, "result": result}).decode("utf-8"))
+
+
+def _handle(request: Dict[str, Any]) -> Dict[str, Any]:
+    """요청 하나를 현재 프로세스에서 실행하고 stdout/stderr/종료 코드를 돌려줌"""
+    import io
+    import traceback
+    from contextlib import redirect_stderr, redirect_stdout
+
+    cwd = os.getcwd()
+    env = dict(os.environ)
+    out, err = io.StringIO(), io.StringIO()
+    exit_code = 0
+    try:
+        os.chdir(request.get("cwd") or cwd)
+        os.environ.update(_forwarded_env(request.get("env") or {}))
+        with redirect_stdout(out), redirect_stderr(err):
+            try:
+                _run(request.get("argv") or [])
+            except SystemExit as exc:
+                if isinstance(exc.code, int):
+                    exit_code = exc.code
+                elif exc.code is not None:
+                    print(exc.code, file=sys.stderr)
+                    exit_code = 1
+            except Exception:
+                traceback.print_exc()
+                exit_code = 1
+    finally:
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(env)
+    return {"stdout": out.getvalue(), "stderr": err.getvalue(), "exit_code": exit_code}
+
+
+def _same_user(conn: Any) -> bool:
+    """연결한 프로세스가 서버와 같은 uid인지 (SO_PEERCRED를 지원하지 않으면 소켓 권한에 맡김)"""
+    import socket
+    import struct
+
+    if not hasattr(socket, "SO_PEERCRED"):
+        return True
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _pid, uid, _gid = struct.unpack("3i", creds)
+    return uid == os.getuid()
+
+
+def _serve(socket_path: str) -> None:
+    """의존성을 한 번 import해 두고 UNIX 소켓으로 받은 요청을 순차 실행 (cwd/env가 프로세스 전역이므로 동시 실행 안 함)"""
+    import socket
+    from importlib import import_module
+
+    for module in _PRELOAD_MODULES:
+        try:
+            import_module(module)
+        except Exception as exc:
+            print(f"[serve] preload skipped: {module} ({exc})", file=sys.stderr)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # 소켓 파일은 소유자만 접근 (0600): bind 시점부터 umask로 막고 chmod로 한 번 더 고정
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    os.chmod(socket_path, 0o600)
+    server.listen()
+    print(f"[serve] listening on {socket_path}", file=sys.stderr)
+    try:
+        while True:
+            conn, _ = server.accept()
+            if not _same_user(conn):
+                conn.close()
+                continue
+            with conn, conn.makefile("rwb") as stream:
+                line = stream.readline()
+                if not line:
+                    continue
+                response = _handle(json.loads(line))
+                stream.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                stream.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def _forward(socket_path: str, argv: List[str]) -> Optional[int]:
+    """--serve 프로세스에 실행을 위임하고 종료 코드를 반환. 서버가 없으면 None"""
+    import socket
+
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    request = {"argv": argv, "cwd": os.getcwd(), "env": _forwarded_env(dict(os.environ))}
+    with sock, sock.makefile("rwb") as stream:
+        stream.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        stream.flush()
+        line = stream.readline()
+    if not line:
+        print("[client] server closed the connection without a response", file=sys.stderr)
+        return 1
+    response = json.loads(line)
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return int(response["exit_code"])
+
+
+def _split_launcher_flags(argv: List[str]) -> Tuple[Dict[str, str], List[str]]:
+    """--serve/--client SOCKET만 떼어냄 (나머지 인자는 _run의 argparse가 처리)"""
+    opts: Dict[str, str] = {}
+    rest: List[str] = []
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        flag, eq, value = arg.partition("=")
+        if flag in ("--serve", "--client"):
+            if not eq:
+                if i + 1 >= len(argv):
+                    sys.exit(f"{flag} requires a SOCKET path")
+                i += 1
+                value = argv[i]
+            opts[flag[2:]] = value
+        else:
+            rest.append(arg)
+        i += 1
+    return opts, rest
+
+
+def main() -> None:
+    opts, argv = _split_launcher_flags(sys.argv[1:])
+
+    if "serve" in opts:
+        _serve(opts["serve"])
+        return
+    if "client" in opts:
+        exit_code = _forward(opts["client"], argv)
+        if exit_code is not None:
+            sys.exit(exit_code)
+    _run(argv)
 
 
 if __name__ == "__main__":  # pragma: no cover
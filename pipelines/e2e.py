@@ -2,9 +2,10 @@
 
 from __future__ import annotations
 
-import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from importlib import import_module
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from pipelines.stages import (
     Stage,
@@ -19,6 +20,8 @@ from pipelines.stages import (
     run_stage_g,
     run_stage_h,
 )
+from pipelines import stage_cache
+from pipelines.utils import has_pictures_in_ocr
 
 
 def _ensure_stage(stage: Stage | str) -> Stage:
@@ -30,21 +33,73 @@ def _ensure_stage(stage: Stage | str) -> Stage:
         raise ValueError(f"unknown stage: {stage}") from exc
 
 
-def _has_pictures_in_ocr(problem_dir: Path) -> bool:
-    """OCR 결과에서 Picture가 있는지 확인"""
-    ocr_path = problem_dir / "problem.json"
-    if not ocr_path.exists():
-        return False
-    
-    try:
-        with ocr_path.open("r", encoding="utf-8") as f:
-            ocr_data = json.load(f)
-        
-        if isinstance(ocr_data, list):
-            return any(item.get("category") == "Picture" for item in ocr_data)
-        return False
-    except Exception:
-        return False
+def _run_ocr(paths: PipelinePaths, image_path: Optional[str], force: bool) -> Dict[str, Any]:
+    if not image_path:
+        raise ValueError("OCR stage requires an image_path")
+    return run_stage_a(paths, image_path=image_path, overwrite=force)
+
+
+def _run_graph(paths: PipelinePaths, image_path: Optional[str], force: bool) -> Dict[str, Any]:
+    # Picture가 있는 경우에만 실행
+    if not has_pictures_in_ocr(paths.ocr_dir):
+        return {"status": "skipped", "reason": "No pictures found in OCR result"}
+    return run_stage_b(paths)
+
+
+def _run_postproc(paths: PipelinePaths, image_path: Optional[str], force: bool) -> Dict[str, Any]:
+    result = run_stage_h(paths)
+    return result if result is not None else {"status": "skipped"}
+
+
+_StageRunner = Callable[[PipelinePaths, Optional[str], bool], Dict[str, Any]]
+
+_STAGE_RUNNERS: Dict[Stage, _StageRunner] = {
+    Stage.A_OCR: _run_ocr,
+    Stage.B_GRAPH: _run_graph,
+    Stage.C_GEO_CODEGEN: lambda paths, image_path, force: run_stage_c(paths, overwrite=force),
+    Stage.D_GEO_COMPUTE: lambda paths, image_path, force: run_stage_d(paths, overwrite=force),
+    Stage.E_CAS_CODEGEN: lambda paths, image_path, force: run_stage_e(paths, force=force),
+    Stage.F_CAS_COMPUTE: lambda paths, image_path, force: run_stage_f(paths, overwrite=force),
+    Stage.G_RENDER: lambda paths, image_path, force: run_stage_g(paths),
+    Stage.H_POSTPROC: _run_postproc,
+}
+
+_STAGE_INDEX: Dict[Stage, int] = {stage: idx for idx, stage in enumerate(STAGE_ORDER)}
+
+
+def _warm_imports(*modules: str) -> Callable[[PipelinePaths], None]:
+    # 단계 모듈 import(openai/numpy/sympy 등)를 직전 단계의 OCR/LLM 대기 시간에 미리 수행
+    def prefetch(paths: PipelinePaths) -> None:
+        for module in modules:
+            import_module(module)
+
+    return prefetch
+
+
+def _prefetch_cas_codegen(paths: PipelinePaths) -> None:
+    from apps.e_cas_codegen import prefetch_codegen_inputs
+
+    prefetch_codegen_inputs(paths.ocr_dir)
+
+
+def _prefetch_cas_compute(paths: PipelinePaths) -> None:
+    from apps.f_cas_compute.compute import _safe_funcs
+
+    _safe_funcs()  # SymPy import + 허용 함수 테이블 구성
+
+
+# stage -> (준비 작업이 읽는 출력을 만드는 단계, 준비 작업). 데이터 의존성만 선언하고, 의존 단계가
+# 끝나는 즉시 스레드에서 시작해 그 사이 단계들과 겹쳐 실행 (단계 자체의 순서는 A→H로 고정:
+# C는 B의 vector_anchors, E는 D의 geo_result, F는 E의 cas_jobs를 읽음).
+# E의 OCR JSON/이미지 인코딩은 A 출력만 필요하므로 B~D 동안 미리 수행
+_STAGE_PREFETCH: Dict[Stage, Tuple[Optional[Stage], Callable[[PipelinePaths], None]]] = {
+    Stage.B_GRAPH: (None, _warm_imports("apps.b_graphsampling.builder")),
+    Stage.C_GEO_CODEGEN: (None, _warm_imports("apps.c_geo_codegen")),
+    Stage.D_GEO_COMPUTE: (None, _warm_imports("apps.d_geo_compute")),
+    Stage.E_CAS_CODEGEN: (Stage.A_OCR, _prefetch_cas_codegen),
+    Stage.F_CAS_COMPUTE: (None, _prefetch_cas_compute),
+    Stage.G_RENDER: (None, _warm_imports("apps.g_render")),
+}
 
 
 def _execute_stage(
@@ -54,29 +109,30 @@ def _execute_stage(
     image_path: Optional[str],
     force: bool,
 ) -> Dict[str, Any]:
-    if stage == Stage.A_OCR:
-        if not image_path:
-            raise ValueError("OCR stage requires an image_path")
-        return run_stage_a(paths, image_path=image_path, overwrite=force)
-    if stage == Stage.B_GRAPH:
-        # Picture가 있는 경우에만 실행
-        if not _has_pictures_in_ocr(paths.problem_dir):
-            return {"status": "skipped", "reason": "No pictures found in OCR result"}
-        return run_stage_b(paths)
-    if stage == Stage.C_GEO_CODEGEN:
-        return run_stage_c(paths, overwrite=force)
-    if stage == Stage.D_GEO_COMPUTE:
-        return run_stage_d(paths, overwrite=force)
-    if stage == Stage.E_CAS_CODEGEN:
-        return run_stage_e(paths, force=force)
-    if stage == Stage.F_CAS_COMPUTE:
-        return run_stage_f(paths, overwrite=force)
-    if stage == Stage.G_RENDER:
-        return run_stage_g(paths)
-    if stage == Stage.H_POSTPROC:
-        result = run_stage_h(paths)
-        return result if result is not None else {"status": "skipped"}
-    raise ValueError(f"Unsupported stage: {stage}")
+    runner = _STAGE_RUNNERS.get(stage)
+    if runner is None:
+        raise ValueError(f"Unsupported stage: {stage}")
+    return runner(paths, image_path, force)
+
+
+def _execute_stage_cached(
+    stage: Stage,
+    paths: PipelinePaths,
+    *,
+    image_path: Optional[str],
+    force: bool,
+    use_cache: bool,
+) -> Dict[str, Any]:
+    """입력 파일 내용이 이전 실행과 같으면 저장된 결과를 재사용 (force면 조회만 건너뛰고 결과는 저장)"""
+    key = stage_cache.stage_key(stage, paths, image_path) if use_cache else None
+    if key is not None and not force:
+        cached = stage_cache.load(stage, paths, key)
+        if cached is not None:
+            return {**cached, "cached": True}
+    result = _execute_stage(stage, paths, image_path=image_path, force=force)
+    if key is not None:
+        stage_cache.store(stage, paths, key, result)
+    return result
 
 
 def run_e2e(
@@ -87,8 +143,14 @@ def run_e2e(
     start_stage: Stage | str = Stage.A_OCR,
     end_stage: Optional[Stage | str] = None,
     force: bool = False,
+    use_cache: bool = True,
 ) -> Dict[str, Any]:
-    """Run the deterministic pipeline from ``start_stage`` to ``end_stage``."""
+    """Run the deterministic pipeline from ``start_stage`` to ``end_stage``.
+
+    With ``use_cache`` a stage whose input files are byte-identical to a previous
+    successful run returns its stored result (restoring its output files)
+    instead of running again; see :mod:`pipelines.stage_cache`.
+    """
 
     start = _ensure_stage(start_stage)
     end = _ensure_stage(end_stage) if end_stage else STAGE_ORDER[-1]
@@ -102,20 +164,42 @@ def run_e2e(
     base_dir = Path(base_dir)
     paths = PipelinePaths(base_dir, problem_name)
 
-    order = STAGE_ORDER
-    start_idx = order.index(start)
-    end_idx = order.index(end)
+    start_idx = _STAGE_INDEX[start]
+    end_idx = _STAGE_INDEX[end]
     if start_idx > end_idx:
         raise ValueError("start_stage must come before end_stage")
 
     stage_results: List[Dict[str, Any]] = []
     current_image = image_path
-
-    for stage in order[start_idx : end_idx + 1]:
-        result = _execute_stage(stage, paths, image_path=current_image, force=force)
-        stage_results.append({"stage": stage.value, "result": result})
-        if stage == Stage.A_OCR:
-            current_image = None  # subsequent stages read from disk
+    selected = STAGE_ORDER[start_idx : end_idx + 1]
+
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        # 준비 작업은 의존 단계가 이번 실행에 없으면(이미 디스크에 있음) 바로, 있으면 그 단계 직후 시작
+        # (실패해도 해당 단계가 직접 다시 읽으므로 무시)
+        prefetches: Dict[Stage, Future] = {}
+        waiting: Dict[Optional[Stage], List[Stage]] = {}
+        for stage in selected[1:]:
+            if stage in _STAGE_PREFETCH:
+                dep = _STAGE_PREFETCH[stage][0]
+                waiting.setdefault(dep if dep in selected else None, []).append(stage)
+        for target in waiting.pop(None, []):
+            prefetches[target] = prefetcher.submit(_STAGE_PREFETCH[target][1], paths)
+
+        try:
+            for stage in selected:
+                if stage in prefetches:
+                    prefetches.pop(stage).exception()
+                result = _execute_stage_cached(
+                    stage, paths, image_path=current_image, force=force, use_cache=use_cache
+                )
+                stage_results.append({"stage": stage.value, "result": result})
+                if stage == Stage.A_OCR:
+                    current_image = None  # subsequent stages read from disk
+                for target in waiting.pop(stage, []):
+                    prefetches[target] = prefetcher.submit(_STAGE_PREFETCH[target][1], paths)
+        finally:
+            for future in prefetches.values():
+                future.cancel()
 
     return {
         "problem_dir": str(paths.problem_dir),
@@ -0,0 +1,281 @@
+"""Content-hash memoisation of pipeline stage results.
+
+Each cached stage declares the files it reads and the files it produces
+(glob patterns relative to the problem directory). The cache key is the
+sha256 of the stage name, :data:`CACHE_VERSION`, the stage's own source
+(its ``apps/`` package plus the shared orchestration modules, so editing a
+stage or its prompt invalidates its entries), ``configs/openai.toml`` and
+every input file. Storing a result also snapshots every output into a
+content-addressed blob store (``.cache/blobs/<sha256>``); a hit restores any
+output that is missing or whose content changed since, so deleting an
+artefact does not force a re-run. Restoring matters because later stages
+legitimately edit earlier artefacts in place (b_graphsampling adds
+``vector_anchors`` to ``problem.json``): replaying A then B reproduces the
+exact files each stage left behind. Each store keeps the newest
+``_MAX_ENTRIES_PER_STAGE`` entries per stage and deletes blobs that no
+remaining entry references (see :func:`prune`).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import tempfile
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from libs.json_io import loads_json, write_json_atomic
+from pipelines.stages import PipelinePaths, Stage, _fast_copy
+
+CACHE_VERSION = 2
+_CONFIG_PATH = Path("configs/openai.toml")
+
+# 단계 코드 지문: 저장소 루트 기준 경로. 프롬프트(.txt)도 결과에 영향을 주므로 포함
+_REPO_ROOT = Path(__file__).resolve().parent.parent
+_SHARED_CODE = ("pipelines/stages.py", "pipelines/utils.py", "libs")
+_STAGE_CODE: Dict[Stage, str] = {
+    Stage.A_OCR: "apps/a_ocr",
+    Stage.B_GRAPH: "apps/b_graphsampling",
+    Stage.C_GEO_CODEGEN: "apps/c_geo_codegen",
+    Stage.D_GEO_COMPUTE: "apps/d_geo_compute",
+    Stage.E_CAS_CODEGEN: "apps/e_cas_codegen",
+    Stage.F_CAS_COMPUTE: "apps/f_cas_compute",
+    Stage.G_RENDER: "apps/g_render",
+}
+_CODE_SUFFIXES = {".py", ".txt"}
+
+# stage_a_ocr 디렉토리는 C/E 단계의 작업 파일도 담기므로 A가 만든 파일만 지정
+_A_OUT = tuple(
+    f"stage_a_ocr/{pattern}"
+    for pattern in (
+        "problem.json",
+        "problem.md",
+        "problem.jpg",
+        "problem_input.*",
+        "*__pic_i*.jpg",
+        "*__pic_i*.png",
+        "*__pic_i*.json",
+    )
+)
+_D_OUT = ("stage_d_geo_compute/geo_result_*.json",)
+
+# stage -> (입력 패턴, 출력 패턴). H(LLM 후처리 + 렌더링)는 캐시하지 않음
+_STAGE_FILES: Dict[Stage, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    Stage.A_OCR: ((), _A_OUT),
+    # B는 problem.json에 vector_anchors를 덧붙이므로 problem.json도 B의 출력으로 스냅샷
+    Stage.B_GRAPH: (
+        _A_OUT,
+        ("stage_b_graphsampling/*", "stage_a_ocr/vector_anchors.json", "stage_a_ocr/problem.json"),
+    ),
+    Stage.C_GEO_CODEGEN: (_A_OUT + ("stage_a_ocr/vector_anchors.json",), ("stage_c_geo_codegen/spec_*.json",)),
+    Stage.D_GEO_COMPUTE: (("stage_c_geo_codegen/spec_*.json",), _D_OUT),
+    Stage.E_CAS_CODEGEN: (
+        _A_OUT + _D_OUT,
+        (
+            "stage_e_cas_codegen/codegen_output.py",
+            "stage_e_cas_codegen/manim_draft.py",
+            "stage_e_cas_codegen/cas_jobs.json",
+        ),
+    ),
+    Stage.F_CAS_COMPUTE: (
+        ("stage_e_cas_codegen/cas_jobs.json",),
+        ("stage_f_cas_compute/cas_results.json", "stage_f_cas_compute/cas_results.json.trusted"),
+    ),
+    Stage.G_RENDER: (
+        ("stage_e_cas_codegen/manim_draft.py", "stage_f_cas_compute/cas_results.json"),
+        ("problem_final.py",),
+    ),
+}
+
+# 실패 결과는 저장하지 않음 (다음 실행에서 다시 시도)
+_UNCACHEABLE_STATUS = {"error", "failed"}
+
+# 단계별로 최근 항목만 유지하고, 남은 항목이 참조하지 않는 blob은 삭제 (캐시가 무한히 커지지 않도록).
+# 방금 만들어진 blob은 다른 프로세스가 항목을 쓰기 직전일 수 있으므로 유예 시간 동안 남겨 둠
+_MAX_ENTRIES_PER_STAGE = 8
+_BLOB_GRACE_SEC = 300
+
+
+def _files(root: Path, patterns: Iterable[str]) -> List[Path]:
+    found = set()
+    for pattern in patterns:
+        found.update(p for p in root.glob(pattern) if p.is_file())
+    return sorted(found)
+
+
+_MADV_SEQUENTIAL = getattr(mmap, "MADV_SEQUENTIAL", None)
+
+
+def _hash_file(h: Any, path: Path) -> None:
+    """파일을 mmap으로 매핑해 해시에 공급 (입력 이미지 등 큰 파일을 bytes로 복사하지 않음)"""
+    with open(path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if _MADV_SEQUENTIAL is not None:
+                mm.madvise(_MADV_SEQUENTIAL)
+            h.update(mm)
+
+
+def _code_files(rel: str) -> List[Path]:
+    path = _REPO_ROOT / rel
+    if path.is_file():
+        return [path]
+    return sorted(
+        p
+        for p in path.rglob("*")
+        if p.suffix in _CODE_SUFFIXES and "__pycache__" not in p.parts and p.is_file()
+    )
+
+
+@lru_cache(maxsize=None)
+def _code_fingerprint(stage: Stage) -> bytes:
+    """단계 소스 파일 내용의 해시 (프로세스당 한 번 계산; a_ocr의 모델 자산은 제외)"""
+    h = hashlib.sha256()
+    rels = _SHARED_CODE + ((_STAGE_CODE[stage],) if stage in _STAGE_CODE else ())
+    for rel in rels:
+        for path in _code_files(rel):
+            h.update(path.relative_to(_REPO_ROOT).as_posix().encode("utf-8") + b"\0")
+            _hash_file(h, path)
+    return h.digest()
+
+
+def stage_key(stage: Stage, paths: PipelinePaths, image_path: Optional[str] = None) -> Optional[str]:
+    """Return the cache key for ``stage`` or ``None`` when it is not cacheable."""
+    spec = _STAGE_FILES.get(stage)
+    if spec is None:
+        return None
+    inputs = _files(paths.problem_dir, spec[0])
+
+    h = hashlib.sha256(f"{CACHE_VERSION}\0{stage.value}\0".encode("utf-8"))
+    h.update(_code_fingerprint(stage))
+    if _CONFIG_PATH.exists():
+        _hash_file(h, _CONFIG_PATH)
+    if stage == Stage.A_OCR:
+        if not image_path or not Path(image_path).exists():
+            return None
+        _hash_file(h, Path(image_path))
+    elif not inputs:
+        return None
+    for path in inputs:
+        h.update(b"\0" + path.relative_to(paths.problem_dir).as_posix().encode("utf-8") + b"\0")
+        _hash_file(h, path)
+    return h.hexdigest()
+
+
+def _cache_root(paths: PipelinePaths) -> Path:
+    return paths.problem_dir / ".cache"
+
+
+def _entry_path(stage: Stage, paths: PipelinePaths, key: str) -> Path:
+    return _cache_root(paths) / stage.value / f"{key}.json"
+
+
+def _blob_path(paths: PipelinePaths, digest: str) -> Path:
+    return _cache_root(paths) / "blobs" / digest
+
+
+def _digest(path: Path) -> str:
+    h = hashlib.sha256()
+    _hash_file(h, path)
+    return h.hexdigest()
+
+
+def _copy_atomic(src: Path, dest: Path) -> None:
+    # 스냅샷/복원 모두 reflink → copy_file_range → sendfile 순으로 커널 안에서 복사
+    # 같은 blob/출력을 동시에 저장·복원해도 섞이지 않도록 임시 파일 이름은 매번 새로 생성
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=dest.name + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        _fast_copy(src, tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def load(stage: Stage, paths: PipelinePaths, key: str) -> Optional[Dict[str, Any]]:
+    """Return the cached result for ``key``, restoring outputs that are missing or changed."""
+    entry_path = _entry_path(stage, paths, key)
+    if not entry_path.exists():
+        return None
+    try:
+        entry = loads_json(entry_path.read_bytes())
+        outputs: Dict[str, str] = entry["outputs"]
+        stale = [
+            (paths.problem_dir / rel, digest)
+            for rel, digest in outputs.items()
+            if not (paths.problem_dir / rel).is_file() or _digest(paths.problem_dir / rel) != digest
+        ]
+        # 복원할 blob이 하나라도 없으면 부분 복원하지 않고 미스로 처리
+        if not all(_blob_path(paths, digest).is_file() for _, digest in stale):
+            return None
+        for dest, digest in stale:
+            _copy_atomic(_blob_path(paths, digest), dest)
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+    return entry["result"]
+
+
+def store(stage: Stage, paths: PipelinePaths, key: str, result: Dict[str, Any]) -> None:
+    if not isinstance(result, dict) or result.get("status") in _UNCACHEABLE_STATUS:
+        return
+    outputs: Dict[str, str] = {}
+    for path in _files(paths.problem_dir, _STAGE_FILES[stage][1]):
+        digest = _digest(path)
+        blob = _blob_path(paths, digest)
+        if not blob.exists():
+            _copy_atomic(path, blob)
+        outputs[path.relative_to(paths.problem_dir).as_posix()] = digest
+    entry_path = _entry_path(stage, paths, key)
+    entry_path.parent.mkdir(parents=True, exist_ok=True)
+    write_json_atomic(entry_path, {"key": key, "result": result, "outputs": outputs})
+    try:
+        prune(paths)
+    except OSError as e:
+        print(f"[WARN] 단계 캐시 정리 실패: {e}")
+
+
+def _unlink_quiet(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def prune(paths: PipelinePaths, max_entries: int = _MAX_ENTRIES_PER_STAGE) -> None:
+    """단계별로 최근 ``max_entries``개 항목만 남기고, 어떤 항목도 참조하지 않는 blob을 삭제"""
+    root = _cache_root(paths)
+    blob_dir = root / "blobs"
+    referenced = set()
+    with os.scandir(root) as stage_dirs:
+        for stage_dir in stage_dirs:
+            if stage_dir.name == "blobs" or not stage_dir.is_dir():
+                continue
+            with os.scandir(stage_dir.path) as it:
+                entries = sorted(
+                    ((e.stat().st_mtime, e.path) for e in it if e.name.endswith(".json") and e.is_file()),
+                    reverse=True,
+                )
+            for _, path in entries[max_entries:]:
+                _unlink_quiet(path)
+            for _, path in entries[:max_entries]:
+                try:
+                    referenced.update(loads_json(Path(path).read_bytes())["outputs"].values())
+                except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                    continue
+    if not blob_dir.is_dir():
+        return
+    cutoff = time.time() - _BLOB_GRACE_SEC
+    with os.scandir(blob_dir) as it:
+        for blob in it:
+            # os.replace로 들어온 시점은 ctime에 남음 (copystat이 mtime을 원본 값으로 되돌리므로)
+            if blob.name not in referenced and not blob.name.endswith(".tmp") and blob.stat().st_ctime < cutoff:
+                _unlink_quiet(blob.path)
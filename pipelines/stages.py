@@ -2,27 +2,30 @@
 
 from __future__ import annotations
 
-import json
+import hashlib
+import logging
 import os
 import shutil
-from dataclasses import dataclass
+import threading
+import tomllib
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
 from types import SimpleNamespace
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-import toml
+from libs.json_io import dumps_json, loads_json, write_files
+from pipelines.utils import find_crop_images, has_pictures_in_ocr, list_dir_names
 
-from libs.schemas import CASResult
-from apps.a_ocr.dots_ocr.parser import DotsOCRParser
-from apps.a_ocr.tools.picture_ocr_pipeline import run_pipeline as run_picture_ocr_pipeline
-from apps.b_graphsampling.builder import build_outputschema
-from apps.c_geo_codegen import generate_spec
-from apps.d_geo_compute import solve_in_problem_dir
-from apps.e_cas_codegen import run_cas_codegen
-from apps.f_cas_compute import run_cas_compute
-from apps.g_render import fill_placeholders
-from pipelines.utils import contains_placeholder
+# 단계별 앱 모듈(OCR/CAS/LLM 의존성)은 해당 단계 함수 안에서 import:
+# CLI --help나 다른 단계만 실행할 때 전체 import 비용을 내지 않도록 함
+if TYPE_CHECKING:
+    from libs.schemas import CASResult
+
+logger = logging.getLogger(__name__)
 
 
 class Stage(Enum):
@@ -39,6 +42,23 @@ class Stage(Enum):
         return self.value
 
 
+# 단계 이름 → Stage (값, enum 이름, 접두어); 모듈 로드 시 한 번 구성
+_STAGE_ALIASES: Dict[str, Stage] = {}
+for _stage in Stage:
+    for _alias in (_stage.value, _stage.name.lower(), _stage.value.split("_")[0]):
+        _STAGE_ALIASES.setdefault(_alias, _stage)
+del _stage, _alias
+
+
+def parse_stage(value: str) -> Stage:
+    """단계 이름 파싱: 값(``b_graphsampling``), enum 이름(``b_graph``), 접두어(``b``) 모두 허용"""
+    value = value.strip().lower()
+    try:
+        return _STAGE_ALIASES[value]
+    except KeyError:
+        raise ValueError(f"unknown stage: {value}") from None
+
+
 STAGE_ORDER: List[Stage] = [
     Stage.A_OCR,
     Stage.B_GRAPH,
@@ -56,79 +76,204 @@ class PipelinePaths:
     base_dir: Path
     problem_name: str
 
+    # 아래 경로들은 __post_init__에서 한 번만 계산 (접근할 때마다 Path를 새로 만들지 않도록)
+    problem_dir: Path = field(init=False, repr=False)
+    stage_dirs: Dict[Stage, Path] = field(init=False, repr=False)
+    # 자주 쓰는 단계 디렉토리는 속성으로도 노출 (stage_dirs[Stage.X] 조회 없이)
+    ocr_dir: Path = field(init=False, repr=False)
+    graph_dir: Path = field(init=False, repr=False)
+    geo_codegen_dir: Path = field(init=False, repr=False)
+    geo_compute_dir: Path = field(init=False, repr=False)
+    cas_codegen_dir: Path = field(init=False, repr=False)
+    cas_compute_dir: Path = field(init=False, repr=False)
+    ocr_json: Path = field(init=False, repr=False)
+    ocr_markdown: Path = field(init=False, repr=False)
+    ocr_visual: Path = field(init=False, repr=False)
+    vector_json: Path = field(init=False, repr=False)
+    spec: Path = field(init=False, repr=False)
+    codegen_output: Path = field(init=False, repr=False)
+    manim_draft: Path = field(init=False, repr=False)
+    cas_jobs: Path = field(init=False, repr=False)
+    cas_results: Path = field(init=False, repr=False)
+    final_code: Path = field(init=False, repr=False)
+
     def __post_init__(self) -> None:
         self.base_dir = self.base_dir.expanduser().resolve()
         self.problem_dir = self.base_dir / self.problem_name
-        self.problem_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 단계별 디렉토리 생성
+
+        # 단계별 디렉토리 생성: scandir 한 번으로 이미 있는 것을 확인하고 없는 것만 mkdir
+        # (problem_dir도 parents=True로 함께 생성되므로 따로 만들지 않음)
+        existing = list_dir_names(self.problem_dir)
         self.stage_dirs = {}
         for stage in STAGE_ORDER:
             stage_dir = self.problem_dir / f"stage_{stage.value}"
-            stage_dir.mkdir(parents=True, exist_ok=True)
+            if stage_dir.name not in existing:
+                stage_dir.mkdir(parents=True, exist_ok=True)
             self.stage_dirs[stage] = stage_dir
 
-    @property
-    def ocr_json(self) -> Path:
-        return self.stage_dirs[Stage.A_OCR] / "problem.json"
-
-    @property
-    def ocr_markdown(self) -> Path:
-        return self.stage_dirs[Stage.A_OCR] / "problem.md"
-
-    @property
-    def ocr_visual(self) -> Path:
-        return self.stage_dirs[Stage.A_OCR] / "problem.jpg"
-
-    @property
-    def vector_json(self) -> Path:
-        return self.stage_dirs[Stage.B_GRAPH] / "vector_anchors.json"
-
-    @property
-    def spec(self) -> Path:
-        return self.stage_dirs[Stage.C_GEO_CODEGEN] / "spec.json"
+        self.ocr_dir = self.stage_dirs[Stage.A_OCR]
+        self.graph_dir = self.stage_dirs[Stage.B_GRAPH]
+        self.geo_codegen_dir = self.stage_dirs[Stage.C_GEO_CODEGEN]
+        self.geo_compute_dir = self.stage_dirs[Stage.D_GEO_COMPUTE]
+        self.cas_codegen_dir = self.stage_dirs[Stage.E_CAS_CODEGEN]
+        self.cas_compute_dir = self.stage_dirs[Stage.F_CAS_COMPUTE]
+
+        self.ocr_json = self.ocr_dir / "problem.json"
+        self.ocr_markdown = self.ocr_dir / "problem.md"
+        self.ocr_visual = self.ocr_dir / "problem.jpg"
+        self.vector_json = self.graph_dir / "vector_anchors.json"
+        self.spec = self.geo_codegen_dir / "spec.json"
+        self.codegen_output = self.cas_codegen_dir / "codegen_output.py"
+        self.manim_draft = self.cas_codegen_dir / "manim_draft.py"
+        self.cas_jobs = self.cas_codegen_dir / "cas_jobs.json"
+        self.cas_results = self.cas_compute_dir / "cas_results.json"
+        self.final_code = self.problem_dir / "problem_final.py"
+    
+    def crop_images(self) -> List[Path]:
+        """크롭된 이미지 파일들을 반환"""
+        return find_crop_images(self.ocr_dir)
 
-    @property
-    def codegen_output(self) -> Path:
-        return self.stage_dirs[Stage.E_CAS_CODEGEN] / "codegen_output.py"
+    def input_image_copy(self) -> Optional[Path]:
+        # run_stage_a는 원본 이미지를 stage_a_ocr/problem_input.*으로 보존
+        return min(self.ocr_dir.glob("problem_input.*"), default=None)
 
-    @property
-    def manim_draft(self) -> Path:
-        return self.stage_dirs[Stage.E_CAS_CODEGEN] / "manim_draft.py"
 
-    @property
-    def cas_jobs(self) -> Path:
-        return self.stage_dirs[Stage.E_CAS_CODEGEN] / "cas_jobs.json"
+# (base_dir, problem_name) -> (problem_dir mtime_ns, PipelinePaths)
+_PATHS_CACHE: Dict[Tuple[str, str], Tuple[int, PipelinePaths]] = {}
+_PATHS_CACHE_MAX = 256
 
-    @property
-    def cas_results(self) -> Path:
-        return self.stage_dirs[Stage.F_CAS_COMPUTE] / "cas_results.json"
 
-    @property
-    def final_code(self) -> Path:
-        return self.problem_dir / "problem_final.py"
-    
-    def crop_images(self) -> List[Path]:
-        """크롭된 이미지 파일들을 반환"""
-        crop_images = []
-        for pattern in ["*__pic_i*.jpg", "*__pic_i*.png", "*__pic_i*.jpeg"]:
-            crop_images.extend(sorted(self.stage_dirs[Stage.A_OCR].glob(pattern)))
-        return crop_images
+def get_paths(base_dir: str | Path, problem_name: str) -> PipelinePaths:
+    """``PipelinePaths(Path(base_dir), problem_name)``를 재사용 (서버 요청마다 resolve/mkdir 9회 반복 방지)
 
-    def input_image_copy(self) -> Optional[Path]:
-        for candidate in sorted(self.problem_dir.glob("problem_input.*")):
-            return candidate
-        return None
+    problem_dir의 mtime이 그대로면(단계 디렉토리가 지워지거나 새로 생기지 않았으면) stat 한 번으로 캐시 사용.
+    """
+    key = (os.fspath(base_dir), problem_name)
+    hit = _PATHS_CACHE.get(key)
+    if hit is not None:
+        try:
+            if os.stat(hit[1].problem_dir).st_mtime_ns == hit[0]:
+                return hit[1]
+        except FileNotFoundError:
+            pass
+    paths = PipelinePaths(Path(base_dir), problem_name)
+    if len(_PATHS_CACHE) >= _PATHS_CACHE_MAX:
+        _PATHS_CACHE.clear()
+    _PATHS_CACHE[key] = (os.stat(paths.problem_dir).st_mtime_ns, paths)
+    return paths
+
+
+
+# Linux FICLONE ioctl (_IOW(0x94, 9, int)): btrfs/XFS 등에서 데이터 복사 없이 CoW 클론
+_FICLONE = 0x40049409
+# 사용자 공간 복사 fallback 버퍼 (shutil 기본 64 KiB 대신; shutil 전역 값은 건드리지 않음)
+_COPY_BUFSIZE = 1 << 20
+
+
+def _kernel_copy(src_fd: int, dest_fd: int) -> None:
+    # copy_file_range가 거부되면(EXDEV/ENOSYS 등) 같은 fd에서 이어서 sendfile (파일을 다시 열지 않음).
+    # 일부 FS(overlayfs, FUSE, NFS)는 아무것도 복사하지 않고 0을 반환하므로 EOF 판단은 원본 크기와 비교:
+    # 덜 복사된 채 0이 나오면 다음 방식으로 이어 가고, sendfile까지 모자라면 OSError로 버퍼 복사에 넘김
+    size = os.fstat(src_fd).st_size
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                n = os.copy_file_range(src_fd, dest_fd, size - copied)
+                if n == 0:
+                    break
+                copied += n
+        except OSError:
+            pass
+    if copied >= size:
+        return
+    if not hasattr(os, "sendfile"):
+        raise OSError("kernel copy incomplete")
+    while copied < size:
+        n = os.sendfile(dest_fd, src_fd, None, size - copied)
+        if n == 0:
+            raise OSError(f"kernel copy stopped at {copied}/{size} bytes")
+        copied += n
+
+
+def _fast_copy(src: str | Path, dest: str | Path) -> None:
+    """``shutil.copy2``와 같은 결과를 가능한 한 커널 안에서 처리.
+
+    reflink(FICLONE) → ``os.copy_file_range`` → ``os.sendfile`` → 1 MiB 버퍼 복사 순으로
+    시도하고 메타데이터(mtime 등)는 ``shutil.copystat``으로 복사.
+    """
+    try:
+        with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+            try:
+                import fcntl
 
-    def crop_images(self) -> List[Path]:
-        images = sorted(self.problem_dir.glob("*__pic_i*.jpg"))
-        images.extend(sorted(self.problem_dir.glob("*__pic_i*.png")))
-        return images
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            except (ImportError, OSError):
+                _kernel_copy(fsrc.fileno(), fdst.fileno())
+    except OSError:
+        # 커널 복사가 모두 막힌 경우 (비 Linux, 일부 네트워크 FS): 큰 버퍼로 읽기/쓰기 횟수를 줄임
+        with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+            shutil.copyfileobj(fsrc, fdst, _COPY_BUFSIZE)
+    shutil.copystat(src, dest)
 
 
 def _copy_with_name(src: Path, dest: Path) -> None:
+    """같은 파일시스템이면 하드링크, 아니면 복사.
+
+    dest를 먼저 지움: 이전 실행이 남긴 하드링크에 "wb"로 쓰면 원본까지 잘리기 때문.
+    """
     dest.parent.mkdir(parents=True, exist_ok=True)
-    shutil.copy2(src, dest)
+    try:
+        if os.path.samefile(src, dest):
+            return  # 이전 출력(problem_input.*)을 입력으로 다시 넘긴 경우
+        dest.unlink()
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(src, dest)
+    except OSError:
+        _fast_copy(src, dest)
+
+
+def _move_files(moves: List[Tuple[Path, Path]]) -> None:
+    """(원본, 대상) 목록을 한 번에 이동: 대상 디렉토리는 한 번씩만 만들고 같은 파일시스템이면 rename,
+    아니면 복사 (원본은 이후 삭제되는 임시 파일)"""
+    for parent in {dest.parent for _, dest in moves}:
+        parent.mkdir(parents=True, exist_ok=True)
+    copies: List[Tuple[Path, Path]] = []
+    for src, dest in moves:
+        try:
+            os.replace(src, dest)
+        except OSError:
+            copies.append((src, dest))
+    if len(copies) <= 1:
+        for src, dest in copies:
+            _fast_copy(src, dest)
+        return
+    # 다른 파일시스템이라 복사해야 하는 파일들(크롭 이미지/JSON 등)은 서로 독립적이므로 스레드로 동시에
+    with ThreadPoolExecutor(max_workers=min(8, len(copies))) as pool:
+        list(pool.map(lambda pair: _fast_copy(*pair), copies))
+
+
+def _rmtree_all(dirs: List[Path]) -> None:
+    for d in dirs:
+        shutil.rmtree(d, ignore_errors=True)
+
+
+def _discard_tree(path: Path) -> None:
+    """디렉토리를 옆 이름으로 rename한 뒤 백그라운드 스레드에서 삭제 (호출자는 rmtree를 기다리지 않음).
+    이전 프로세스가 지우다 만 ``<name>.old-*`` 디렉토리도 함께 정리"""
+    doomed = list(path.parent.glob(f"{path.name}.old-*"))
+    try:
+        old = path.with_name(f"{path.name}.old-{uuid.uuid4().hex[:8]}")
+        os.rename(path, old)
+        doomed.append(old)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        shutil.rmtree(path, ignore_errors=True)
+    if doomed:
+        threading.Thread(target=_rmtree_all, args=(doomed,), daemon=True).start()
 
 
 def run_stage_a(paths: PipelinePaths, image_path: str, *, overwrite: bool = False) -> Dict[str, Any]:
@@ -144,8 +289,10 @@ def run_stage_a(paths: PipelinePaths, image_path: str, *, overwrite: bool = Fals
         }
 
     tmp_root = paths.problem_dir / "__ocr_raw"
-    if tmp_root.exists():
-        shutil.rmtree(tmp_root)
+    _discard_tree(tmp_root)
+
+    from apps.a_ocr.dots_ocr.parser import DotsOCRParser
+    from apps.a_ocr.tools.picture_ocr_pipeline import run_pipeline as run_picture_ocr_pipeline
 
     parser = DotsOCRParser(output_dir=str(tmp_root))
     run_picture_ocr_pipeline(parser=parser, input_path=str(src))
@@ -157,65 +304,81 @@ def run_stage_a(paths: PipelinePaths, image_path: str, *, overwrite: bool = Fals
         candidate_dir = candidate_dir / stem
     search_root = candidate_dir if candidate_dir.exists() else tmp_root
 
-    json_candidates = sorted(
-        [p for p in search_root.rglob("*.json") if "__pic_i" not in p.stem]
-    )
+    # OCR 출력 트리를 한 번만 순회하며 본문/마크다운/시각화/크롭 파일을 분류 (rglob 5회 → os.walk 1회)
+    json_candidates: List[Path] = []
+    md_candidates: List[Path] = []
+    visual_candidates: List[Path] = []
+    crops: List[Path] = []
+    # bytes 경로로 순회해 이름을 디코딩하지 않고 분류, 남길 파일만 Path로 변환
+    # (os.walk는 scandir 기반이라 stat 호출 없음)
+    for dirpath, _dirnames, filenames in os.walk(os.fsencode(search_root)):
+        for name in filenames:
+            name_stem, suffix = os.path.splitext(name)
+            if suffix == b".md":
+                bucket = md_candidates
+            elif name_stem.find(b"__pic_i") != -1:
+                bucket = crops if suffix in (b".jpg", b".png", b".json") else None
+            elif suffix == b".json":
+                bucket = json_candidates
+            elif suffix == b".jpg":
+                bucket = visual_candidates
+            else:
+                bucket = None
+            if bucket is not None:
+                bucket.append(Path(os.fsdecode(os.path.join(dirpath, name))))
     if not json_candidates:
         raise FileNotFoundError("OCR stage did not produce a JSON file")
-
-    main_json = next((p for p in json_candidates if p.stem == stem), json_candidates[0])
-    md_candidates = sorted(search_root.rglob("*.md"))
-    visual_candidates = sorted(
-        [p for p in search_root.rglob("*.jpg") if "__pic_i" not in p.stem]
-    )
-
-    # Stage A 출력을 stage_a_ocr 디렉토리에 저장
-    _copy_with_name(main_json, paths.ocr_json)
-    if md_candidates:
-        _copy_with_name(md_candidates[0], paths.ocr_markdown)
-    if visual_candidates:
-        _copy_with_name(visual_candidates[0], paths.ocr_visual)
-
-    # 크롭 이미지들을 stage_a_ocr 디렉토리에 저장
-    for crop in search_root.rglob("*__pic_i*.jpg"):
-        _copy_with_name(crop, paths.stage_dirs[Stage.A_OCR] / crop.name)
-    for crop in search_root.rglob("*__pic_i*.png"):
-        _copy_with_name(crop, paths.stage_dirs[Stage.A_OCR] / crop.name)
-    for crop_json in search_root.rglob("*__pic_i*.json"):
-        _copy_with_name(crop_json, paths.stage_dirs[Stage.A_OCR] / crop_json.name)
+    # 첫 번째 것만 쓰므로 정렬 대신 min (이름이 stem과 같은 JSON 우선)
+    main_json = min((p for p in json_candidates if p.stem == stem), default=None) or min(json_candidates)
+    markdown = min(md_candidates, default=None)
+    visual = min(visual_candidates, default=None)
+
+    # Stage A 출력과 크롭 이미지들을 stage_a_ocr 디렉토리로 한 번에 이동 (__ocr_raw는 끝에서 삭제되므로 복사하지 않음)
+    moves: List[Tuple[Path, Path]] = [(main_json, paths.ocr_json)]
+    if markdown is not None:
+        moves.append((markdown, paths.ocr_markdown))
+    if visual is not None:
+        moves.append((visual, paths.ocr_visual))
+    moves.extend((crop, paths.ocr_dir / crop.name) for crop in crops)
+    _move_files(moves)
 
     # 원본 이미지를 stage_a_ocr 디렉토리에 보존
-    input_copy = paths.stage_dirs[Stage.A_OCR] / f"problem_input{src.suffix.lower()}"
+    input_copy = paths.ocr_dir / f"problem_input{src.suffix.lower()}"
     _copy_with_name(src, input_copy)
 
-    shutil.rmtree(tmp_root, ignore_errors=True)
+    _discard_tree(tmp_root)
 
     return {
         "status": "ok",
         "json": str(paths.ocr_json),
-        "markdown": str(paths.ocr_markdown) if paths.ocr_markdown.exists() else None,
-        "visual": str(paths.ocr_visual) if paths.ocr_visual.exists() else None,
+        # 이번 실행에서 옮긴 파일은 stat 없이 보고 (없으면 이전 실행이 남긴 파일 확인)
+        "markdown": str(paths.ocr_markdown) if markdown is not None or paths.ocr_markdown.exists() else None,
+        "visual": str(paths.ocr_visual) if visual is not None or paths.ocr_visual.exists() else None,
         "crops": [p.name for p in paths.crop_images()],
     }
 
 
+# build_outputschema 옵션 (읽기 전용으로 공유, 호출마다 새로 만들지 않음)
+_GRAPH_BUILDER_ARGS = SimpleNamespace(
+    emit_anchors=True,
+    frame="14x8",
+    dpi=300,
+    vectorizer="potrace",
+    points_per_path=600,
+)
+
+
 def run_stage_b(paths: PipelinePaths) -> Dict[str, Any]:
     if not paths.ocr_json.exists():
         raise FileNotFoundError("problem.json missing – run OCR stage first")
 
-    args = SimpleNamespace(
-        emit_anchors=True,
-        frame="14x8",
-        dpi=300,
-        vectorizer="potrace",
-        points_per_path=600,
-    )
-    
+    from apps.b_graphsampling.builder import build_outputschema
+
     # Stage A의 출력 디렉토리를 입력으로 사용
     payload = build_outputschema(
-        str(paths.stage_dirs[Stage.A_OCR]),
+        str(paths.ocr_dir),
         str(paths.vector_json),
-        args=args,
+        args=_GRAPH_BUILDER_ARGS,
     )
     
     # payload는 리스트이므로 pictures 개수를 다르게 계산
@@ -232,26 +395,9 @@ def run_stage_b(paths: PipelinePaths) -> Dict[str, Any]:
     }
 
 
-def _has_pictures_in_ocr(problem_dir: Path) -> bool:
-    """OCR 결과에서 Picture가 있는지 확인"""
-    ocr_path = problem_dir / "problem.json"
-    if not ocr_path.exists():
-        return False
-    
-    try:
-        with ocr_path.open("r", encoding="utf-8") as f:
-            ocr_data = json.load(f)
-        
-        if isinstance(ocr_data, list):
-            return any(item.get("category") == "Picture" for item in ocr_data)
-        return False
-    except Exception:
-        return False
-
-
 def run_stage_c(paths: PipelinePaths, *, overwrite: bool = False) -> Dict[str, Any]:
     # Picture가 있는 경우에만 spec 생성 시도
-    if not _has_pictures_in_ocr(paths.stage_dirs[Stage.A_OCR]):
+    if not has_pictures_in_ocr(paths.ocr_dir):
         return {
             "status": "skipped",
             "reason": "No pictures found in OCR result",
@@ -261,15 +407,14 @@ def run_stage_c(paths: PipelinePaths, *, overwrite: bool = False) -> Dict[str, A
     # Stage C의 새로운 함수 사용 (여러 이미지 처리)
     from apps.c_geo_codegen import generate_specs_for_all_images
     specs = generate_specs_for_all_images(
-        paths.stage_dirs[Stage.A_OCR],
+        paths.ocr_dir,
         overwrite=overwrite,
     )
     
-    # 개별 spec 파일들을 stage_c_geo_codegen 디렉토리로 복사
-    for i, spec in enumerate(specs):
-        spec_file = paths.stage_dirs[Stage.C_GEO_CODEGEN] / f"spec_{i}.json"
-        with spec_file.open("w", encoding="utf-8") as f:
-            json.dump(spec, f, ensure_ascii=False, indent=2)
+    # 개별 spec 파일들을 stage_c_geo_codegen 디렉토리로 복사 (orjson 직렬화 후 os.write로 연달아 기록)
+    spec_dir = paths.geo_codegen_dir
+    spec_paths = [spec_dir / f"spec_{i}.json" for i in range(len(specs))]
+    write_files(zip(spec_paths, map(dumps_json, specs)))
     
     if not specs:
         return {
@@ -281,15 +426,18 @@ def run_stage_c(paths: PipelinePaths, *, overwrite: bool = False) -> Dict[str, A
     return {
         "status": "draft",
         "spec_count": len(specs),
-        "spec_paths": [str(paths.stage_dirs[Stage.C_GEO_CODEGEN] / f"spec_{i}.json") for i in range(len(specs))],
+        "spec_paths": [str(p) for p in spec_paths],
     }
 
 
 def run_stage_d(paths: PipelinePaths, *, overwrite: bool = True) -> Dict[str, Any]:
-    # spec_*.json 파일들이 없으면 스킵
-    import glob
-    spec_files = glob.glob(str(paths.stage_dirs[Stage.C_GEO_CODEGEN] / "spec_*.json"))
-    if not spec_files:
+    # spec_*.json 파일들이 없으면 스킵 (존재 여부만 필요하므로 첫 항목에서 중단, 목록/fnmatch 없이)
+    try:
+        with os.scandir(paths.geo_codegen_dir) as entries:
+            has_spec = any(e.name.startswith("spec_") and e.name.endswith(".json") for e in entries)
+    except FileNotFoundError:
+        has_spec = False
+    if not has_spec:
         return {
             "status": "skipped",
             "reason": "No spec_*.json files found",
@@ -299,15 +447,15 @@ def run_stage_d(paths: PipelinePaths, *, overwrite: bool = True) -> Dict[str, An
     try:
         # Stage D의 새로운 함수 사용 (여러 spec 처리)
         from apps.d_geo_compute import solve_all_specs_in_problem_dir
-        results = solve_all_specs_in_problem_dir(paths.stage_dirs[Stage.C_GEO_CODEGEN], overwrite=overwrite)
+        results = solve_all_specs_in_problem_dir(paths.geo_codegen_dir, overwrite=overwrite)
         
         # 개별 결과 파일들을 stage_d_geo_compute 디렉토리로 복사
         for result in results:
             if result.get("status") == "solved" and "result_path" in result:
                 image_index = result.get("image_index", 0)
-                target_path = paths.stage_dirs[Stage.D_GEO_COMPUTE] / f"geo_result_{image_index}.json"
-                with open(result["result_path"], "r", encoding="utf-8") as src, target_path.open("w", encoding="utf-8") as dst:
-                    dst.write(src.read())
+                target_path = paths.geo_compute_dir / f"geo_result_{image_index}.json"
+                # 같은 파일시스템이면 하드링크 (planner는 write_json_atomic으로 새 inode를 쓰므로 원본과 분리됨)
+                _copy_with_name(Path(result["result_path"]), target_path)
         
         solved_count = sum(1 for r in results if r.get("status") == "solved")
         return {
@@ -318,8 +466,7 @@ def run_stage_d(paths: PipelinePaths, *, overwrite: bool = True) -> Dict[str, An
         }
     except Exception as e:
         # 에러 발생 시 GPT로 자동 수정 시도
-        print(f"[STAGE_D] Error occurred: {e}")
-        print("[STAGE_D] Attempting error correction with GPT...")
+        logger.warning("[STAGE_D] Error occurred: %s; attempting error correction with GPT", e)
         
         try:
             from apps.d_geo_compute.error_handler import retry_with_fix
@@ -330,7 +477,7 @@ def run_stage_d(paths: PipelinePaths, *, overwrite: bool = True) -> Dict[str, An
             )
             return result
         except Exception as correction_error:
-            print(f"[STAGE_D] Error correction failed: {correction_error}")
+            logger.error("[STAGE_D] Error correction failed: %s", correction_error)
             return {
                 "status": "error",
                 "error": f"Original error: {e}. Correction failed: {correction_error}",
@@ -347,25 +494,25 @@ def run_stage_e(paths: PipelinePaths, *, force: bool = False) -> Dict[str, Any]:
     # Stage E는 항상 실행 (스킵 없음)
     from apps.e_cas_codegen import run_cas_codegen_for_multiple_results
     result = run_cas_codegen_for_multiple_results(
-        paths.stage_dirs[Stage.A_OCR],  # A_OCR 디렉토리에서 OCR JSON과 이미지 읽기
-        ocr_json_path=paths.ocr_json,
+        paths.ocr_dir,  # A_OCR 디렉토리에서 OCR JSON(problem.json 기본값)과 이미지 읽기
         image_path=image,
         force=force,
     )
     
     # 결과 파일들을 stage_e_cas_codegen 디렉토리로 복사
     if result.get("code_path"):
-        import shutil
-        shutil.copy2(result["code_path"], paths.codegen_output)
+        _fast_copy(result["code_path"], paths.codegen_output)
     if result.get("manim_path"):
-        shutil.copy2(result["manim_path"], paths.manim_draft)
+        _fast_copy(result["manim_path"], paths.manim_draft)
     if result.get("jobs_path"):
-        shutil.copy2(result["jobs_path"], paths.cas_jobs)
+        _fast_copy(result["jobs_path"], paths.cas_jobs)
     
     return result
 
 
 def run_stage_f(paths: PipelinePaths, *, overwrite: bool = True) -> Dict[str, Any]:
+    from apps.f_cas_compute import run_cas_compute
+
     try:
         return run_cas_compute(
             paths.problem_dir,
@@ -375,8 +522,7 @@ def run_stage_f(paths: PipelinePaths, *, overwrite: bool = True) -> Dict[str, An
         )
     except Exception as e:
         # 에러 발생 시 GPT로 자동 수정 시도
-        print(f"[STAGE_F] Error occurred: {e}")
-        print("[STAGE_F] Attempting error correction with GPT...")
+        logger.warning("[STAGE_F] Error occurred: %s; attempting error correction with GPT", e)
         
         try:
             from apps.f_cas_compute.error_handler import retry_with_fix
@@ -388,7 +534,7 @@ def run_stage_f(paths: PipelinePaths, *, overwrite: bool = True) -> Dict[str, An
             )
             return result
         except Exception as correction_error:
-            print(f"[STAGE_F] Error correction failed: {correction_error}")
+            logger.error("[STAGE_F] Error correction failed: %s", correction_error)
             return {
                 "status": "error",
                 "error": f"Original error: {e}. Correction failed: {correction_error}",
@@ -397,77 +543,147 @@ def run_stage_f(paths: PipelinePaths, *, overwrite: bool = True) -> Dict[str, An
             }
 
 
-def _load_cas_results(path: Path) -> List[CASResult]:
-    if not path.exists():
-        return []
+@lru_cache(maxsize=1)
+def _cas_results_adapter():
+    # TypeAdapter 생성(스키마 빌드)은 한 번만
+    from pydantic import TypeAdapter
+    from libs.schemas import CASResult
+
+    return TypeAdapter(List[CASResult])
+
+
+@lru_cache(maxsize=32)
+def _parse_cas_results(raw: bytes, trusted: bool = False) -> Tuple[CASResult, ...]:
+    # 파일 내용(bytes)이 키: 같은 cas_results.json을 다시 읽으면 파싱/검증 없이 재사용
+    from pydantic import ValidationError
+    from libs.schemas import CASResult
+
     try:
-        data = json.loads(path.read_text(encoding="utf-8"))
-    except json.JSONDecodeError:
-        return []
+        data = loads_json(raw)
+    except ValueError:  # json.JSONDecodeError / orjson.JSONDecodeError 모두 ValueError 하위
+        return ()
     if not isinstance(data, list):
-        return []
+        return ()
+    # F 단계가 검증된 결과로 직접 쓴 파일이면 pydantic 검증 생략
+    if trusted:
+        return tuple(CASResult.model_construct(**item) for item in data)
+    # 전체 목록을 한 번에 검증 (pydantic-core 루프), 잘못된 항목이 있으면 항목별로 걸러냄
+    try:
+        return tuple(_cas_results_adapter().validate_python(data))
+    except ValidationError:
+        pass
     results: List[CASResult] = []
     for item in data:
         try:
             results.append(CASResult(**item))
         except Exception:
             continue
-    return results
+    return tuple(results)
+
+
+@lru_cache(maxsize=32)
+def _read_cas_results(path: str, mtime_ns: int, size: int) -> Tuple[CASResult, ...]:
+    # (경로, mtime, 크기)가 같으면 파일을 다시 읽지도 않음; 내용이 같은 다른 파일은 _parse_cas_results가 재사용
+    from apps.f_cas_compute.compute import trusted_marker_path
+
+    with open(path, "rb") as fh:
+        raw = fh.read()
+    try:
+        trusted = trusted_marker_path(path).read_bytes() == hashlib.sha256(raw).hexdigest().encode("ascii")
+    except OSError:
+        trusted = False
+    return _parse_cas_results(raw, trusted)
+
+
+def _load_cas_results(path: Path) -> List[CASResult]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return []
+    return list(_read_cas_results(os.fspath(path), st.st_mtime_ns, st.st_size))
 
 
 def run_stage_g(paths: PipelinePaths) -> Dict[str, Any]:
-    if not paths.manim_draft.exists():
-        raise FileNotFoundError("manim_draft.py missing – run cas_codegen first")
+    # exists() 확인 없이 바로 읽고 없으면 같은 메시지로 실패
+    try:
+        manim_code = paths.manim_draft.read_bytes().decode("utf-8")
+    except FileNotFoundError:
+        raise FileNotFoundError("manim_draft.py missing – run cas_codegen first") from None
+
+    from apps.g_render import fill_placeholders
 
-    manim_code = paths.manim_draft.read_text(encoding="utf-8")
     cas_results = _load_cas_results(paths.cas_results)
     final = fill_placeholders(manim_code, cas_results)
-    paths.final_code.write_text(final.manim_code_final, encoding="utf-8")
+    # 한 번 인코딩한 bytes를 파일 객체 없이 기록
+    write_files([(paths.final_code, final.manim_code_final.encode("utf-8"))])
 
     return {
         "status": "rendered",
         "final_path": str(paths.final_code),
-        "placeholders_remaining": contains_placeholder(final.manim_code_final),
+        # fill_placeholders는 치환되지 않은 placeholder가 남으면 예외를 던지므로 다시 스캔하지 않음
+        "placeholders_remaining": False,
     }
 
 
 # --- Post-processing -------------------------------------------------------
 
-def _load_postproc_conf() -> Dict[str, Any]:
+_OPENAI_CONFIG_PATH = Path("configs/openai.toml")
+
+
+@lru_cache(maxsize=1)
+def _read_postproc_toml(path: str, mtime_ns: int) -> Dict[str, Any]:
+    """openai.toml의 [postproc]/[models]를 기본값이 채워진 설정으로 변환 (mtime_ns는 캐시 키 용도)"""
     try:
-        full_cfg = toml.load("configs/openai.toml")
+        with open(path, "rb") as fh:
+            full_cfg = tomllib.load(fh)
         cfg = full_cfg.get("postproc", {})
         models_cfg = full_cfg.get("models", {})
     except Exception:
         cfg = {}
         models_cfg = {}
 
-    override = os.environ.get("POSTPROC_ENABLED_OVERRIDE")
-    if override == "1":
-        enabled = True
-    elif override == "0":
-        enabled = False
-    else:
-        enabled = cfg.get("enabled", False)
-    
     return {
-        "enabled": enabled,
+        "enabled": cfg.get("enabled", False),
         "model": models_cfg.get("postproc", "gpt-4o-mini"),
         "temperature": float(cfg.get("temperature", 0.2)),
         "max_loops": int(cfg.get("max_loops", 3)),
         "quality": cfg.get("quality", "-ql"),
         "timeout_sec": int(cfg.get("timeout_sec", 30)),
+        "batch": bool(cfg.get("batch", False)),
+        "hq_async": bool(cfg.get("hq_async", True)),
     }
 
 
+def _load_postproc_conf() -> Dict[str, Any]:
+    # 파일 파싱/변환은 mtime이 같으면 재사용하고 환경 변수 override만 호출마다 반영
+    try:
+        mtime_ns = _OPENAI_CONFIG_PATH.stat().st_mtime_ns
+    except OSError:
+        mtime_ns = -1
+    conf = dict(_read_postproc_toml(str(_OPENAI_CONFIG_PATH), mtime_ns))
+
+    override = os.environ.get("POSTPROC_ENABLED_OVERRIDE")
+    if override == "1":
+        conf["enabled"] = True
+    elif override == "0":
+        conf["enabled"] = False
+    return conf
+
+
+@lru_cache(maxsize=4)
+def _get_postproc_llm(llm_cls, model: str, temperature: float):
+    # 문제마다 새로 만들지 않고 공유 (프롬프트 로드/클라이언트 생성 1회, OpenAI 클라이언트는 thread-safe)
+    return llm_cls(model=model, temperature=temperature)
+
+
 def run_postproc_stage(problem_name: str, base_dir: Path) -> Optional[Dict[str, Any]]:
     conf = _load_postproc_conf()
     if not conf["enabled"]:
         return None
 
     try:
-        from libs.postproc.postproc import postprocess_and_render, Config as PostCfg
-        from libs.postproc.llm_openai import OpenAICompatLLM
+        from apps.h_postproc.postproc import postprocess_and_render, Config as PostCfg
+        from apps.h_postproc.llm_openai import OpenAICompatLLM
     except Exception:
         return None
 
@@ -475,10 +691,7 @@ def run_postproc_stage(problem_name: str, base_dir: Path) -> Optional[Dict[str,
     if not input_py.exists():
         return None
 
-    llm = OpenAICompatLLM(
-        model=conf["model"],
-        temperature=conf["temperature"],
-    )
+    llm = _get_postproc_llm(OpenAICompatLLM, conf["model"], conf["temperature"])
     code_path, video_path, proof = postprocess_and_render(
         problem_name,
         llm,
@@ -486,10 +699,60 @@ def run_postproc_stage(problem_name: str, base_dir: Path) -> Optional[Dict[str,
             max_loops=conf["max_loops"],
             manim_quality=conf["quality"],
             timeout_sec=conf["timeout_sec"],
+            hq_async=conf["hq_async"],
         ),
     )
     return {"code_path": code_path, "video_path": video_path, "proof": proof}
 
 
+def run_postproc_stage_many(
+    problem_names: List[str],
+    base_dir: Path,
+    *,
+    max_concurrency: int = 8,
+    batch: Optional[bool] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """Post-process several problems concurrently, overlapping their LLM calls and renders.
+
+    With ``batch`` (default: ``[postproc].batch`` in openai.toml) the first-pass
+    LLM fixes are submitted together through the OpenAI Batch API.
+    """
+    conf = _load_postproc_conf()
+    if not conf["enabled"]:
+        return None
+
+    try:
+        from apps.h_postproc.postproc import postprocess_many, Config as PostCfg
+        from apps.h_postproc.llm_openai import OpenAICompatLLM
+    except Exception:
+        return None
+
+    names = [name for name in problem_names if (base_dir / name / f"{name}.py").exists()]
+    if not names:
+        return None
+
+    llm = _get_postproc_llm(OpenAICompatLLM, conf["model"], conf["temperature"])
+    outcomes = postprocess_many(
+        names,
+        llm,
+        PostCfg(
+            max_loops=conf["max_loops"],
+            manim_quality=conf["quality"],
+            timeout_sec=conf["timeout_sec"],
+            hq_async=conf["hq_async"],
+        ),
+        max_concurrency=max_concurrency,
+        batch=conf["batch"] if batch is None else batch,
+    )
+    results: List[Dict[str, Any]] = []
+    for name, outcome in zip(names, outcomes):
+        if isinstance(outcome, Exception):
+            results.append({"problem_name": name, "status": "error", "error": str(outcome)})
+            continue
+        code_path, video_path, proof = outcome
+        results.append({"problem_name": name, "code_path": code_path, "video_path": video_path, "proof": proof})
+    return results
+
+
 def run_stage_h(paths: PipelinePaths) -> Optional[Dict[str, Any]]:
     return run_postproc_stage(paths.problem_name, paths.problem_dir.parent)
@@ -2,77 +2,42 @@
 
 from __future__ import annotations
 
-import json
+import mmap
+import os
 import re
-from typing import Dict, List, Tuple
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
 
-from libs.schemas import CASResult
+from libs.json_io import loads_json
+
+if TYPE_CHECKING:
+    from libs.schemas import CASResult
 
 _PLACEHOLDER_RE = re.compile(r"\[\[CAS:([A-Za-z0-9_\-]+)\]\]")
+_PICTURE_CATEGORY_RE = re.compile(rb'"category"\s*:\s*"Picture"')
 
 
-def strip_code_fences(text: str) -> str:
-    if not text:
+def _strip_fence_head(text: str) -> str:
+    # ^\s*```(?:python)?\s* 제거와 동일 (여는 펜스가 없으면 앞 공백도 그대로 둠)
+    head = text.lstrip()
+    if not head.startswith("```"):
         return text
-    text = re.sub(r"^\s*```(?:python)?\s*", "", text)
-    text = re.sub(r"\s*```\s*$", "", text)
-    return text
+    head = head[3:]
+    if head.startswith("python"):
+        head = head[6:]
+    return head.lstrip()
 
 
-def find_balanced_json_array(text: str, start_idx: int = 0) -> str:
-    i = text.find("[", start_idx)
-    if i == -1:
-        raise RuntimeError("CAS-JOBS JSON 배열 시작 '['를 찾지 못했습니다.")
-    depth = 0
-    for j, char in enumerate(text[i:], start=i):
-        if char == "[":
-            depth += 1
-        elif char == "]":
-            depth -= 1
-            if depth == 0:
-                return text[i : j + 1]
-    raise RuntimeError("대괄호 균형이 맞는 JSON 배열 끝을 찾지 못했습니다.")
-
-
-def normalize_expr_for_sympy(expr: str) -> str:
-    if not expr:
-        return expr
-    expr = expr.replace(r"\left", "").replace(r"\right", "")
-    expr = re.sub(r"\\frac\s*\{([^{}]+)\}\s*\{([^{}]+)\}", r"(\1)/(\2)", expr)
-    expr = expr.replace("\\", "")
-    return " ".join(expr.split())
-
-
-def extract_jobs_and_code(code_text: str) -> Tuple[List[dict], str]:
-    code_text = strip_code_fences(code_text)
-    marker = re.search(r"-{3}CAS-JOBS-{3}", code_text)
-    if not marker:
-        raise RuntimeError("CAS-JOBS 섹션을 찾을 수 없습니다.")
-    manim_code = code_text[: marker.start()].strip()
-    tail = code_text[marker.end() :]
-
-    json_text = find_balanced_json_array(tail, 0)
-    try:
-        jobs_raw = json.loads(json_text)
-    except Exception:
-        obj_pat = re.compile(
-            r"\{[^{}]*?(\"task\"\s*:\s*\"[^\"]+\")[^{}]*?(\"target_expr\"\s*:\s*\"[^\"]+\")[^{}]*?\}",
-            re.S,
-        )
-        jobs_raw = []
-        for match in obj_pat.finditer(json_text):
-            fragment = re.sub(r",\s*(\}|$)", r"\1", match.group(0))
-            try:
-                jobs_raw.append(json.loads(fragment))
-            except Exception:
-                continue
-        if not jobs_raw:
-            raise RuntimeError("CAS-JOBS JSON 파싱 실패(수복 불가).")
-
-    for idx, job in enumerate(jobs_raw, start=1):
-        job.setdefault("id", f"S{idx}")
-        job["target_expr"] = normalize_expr_for_sympy(job.get("target_expr", ""))
-    return jobs_raw, manim_code
+def strip_code_fences(text: str) -> str:
+    # 펜스가 없는 응답(대부분)은 그대로 반환; 앞뒤 펜스는 정규식 대신 strip/슬라이스로 제거
+    if not text or "```" not in text:
+        return text
+    text = _strip_fence_head(text)
+    tail = text.rstrip()
+    if tail.endswith("```"):
+        text = tail[:-3].rstrip()
+    return text
 
 
 def contains_placeholder(text: str) -> bool:
@@ -87,3 +52,84 @@ def substitute_placeholders(expr: str, results: Dict[str, CASResult]) -> str:
         return f"({results[identifier].result_py})"
 
     return _PLACEHOLDER_RE.sub(repl, expr)
+
+
+@lru_cache(maxsize=32)
+def _load_json_cached(path: str, mtime_ns: int, size: int) -> Any:
+    with open(path, "rb") as fh:
+        return loads_json(fh.read())
+
+
+def load_ocr_json(path: str | Path) -> Any:
+    """OCR JSON 파싱 결과를 (경로, mtime, 크기)가 같으면 재사용. 반환값은 공유되므로 수정하지 말 것"""
+    st = os.stat(path)
+    return _load_json_cached(os.fspath(path), st.st_mtime_ns, st.st_size)
+
+
+_CROP_SUFFIXES = (".jpg", ".png", ".jpeg")
+
+
+def list_dir_names(directory: str | Path) -> Set[str]:
+    """디렉토리 항목 이름을 scandir 한 번으로 수집 (파일마다 stat/glob 하지 않도록)"""
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries}
+    except FileNotFoundError:
+        return set()
+
+
+def find_crop_images(directory: str | Path, names: Optional[Set[str]] = None) -> List[Path]:
+    """Stage A 크롭 이미지(``*__pic_i*``) 목록 (jpg → png → jpeg, 각각 이름순)
+
+    ``names``에 이미 읽어 둔 디렉토리 항목 이름을 넘기면 다시 scandir 하지 않음.
+    """
+    directory = Path(directory)
+    if names is None:
+        names = list_dir_names(directory)
+    # 한 번 훑어 확장자별로 나누고, 전체 목록이 아닌 크롭 이름만 정렬
+    buckets: Dict[str, List[str]] = {ext: [] for ext in _CROP_SUFFIXES}
+    for name in names:
+        if "__pic_i" in name:
+            ext = next((ext for ext in _CROP_SUFFIXES if name.endswith(ext)), None)
+            if ext is not None:
+                buckets[ext].append(name)
+    return [directory / name for ext in _CROP_SUFFIXES for name in sorted(buckets[ext])]
+
+
+def _has_crop_images(ocr_dir: str | Path) -> bool:
+    try:
+        with os.scandir(ocr_dir) as entries:
+            return any("__pic_i" in e.name and e.name.endswith(_CROP_SUFFIXES) for e in entries)
+    except OSError:
+        return False
+
+
+@lru_cache(maxsize=128)
+def _mentions_picture_cached(path: str, mtime_ns: int, size: int) -> bool:
+    """파일 바이트에 ``"category": "Picture"`` 쌍이 있는지 (mmap 위에서 C 수준 검색, 첫 일치에서 중단)
+
+    JSON 문자열 안의 따옴표는 이스케이프되므로 본문 텍스트가 이 패턴과 일치할 수는 없음.
+    """
+    if size == 0:
+        return False
+    with open(path, "rb") as fh:
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _PICTURE_CATEGORY_RE.search(mm) is not None
+
+
+def _mentions_picture(path: Path) -> bool:
+    # B/C/E 단계와 서버가 같은 problem.json을 여러 번 확인하므로 (경로, mtime, 크기)가 같으면 재사용
+    st = os.stat(path)
+    return _mentions_picture_cached(os.fspath(path), st.st_mtime_ns, st.st_size)
+
+
+def has_pictures_in_ocr(ocr_dir: str | Path) -> bool:
+    """``ocr_dir/problem.json``에 Picture 블록이 있는지 확인"""
+    # Stage A는 Picture 블록마다 크롭(__pic_i*)을 남기므로 크롭이 있으면 JSON 파싱 생략
+    if _has_crop_images(ocr_dir):
+        return True
+    # 전체를 파싱하지 않고 바이트 검색으로 판단
+    try:
+        return _mentions_picture(Path(ocr_dir) / "problem.json")
+    except (OSError, ValueError):
+        return False
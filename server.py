@@ -1,16 +1,15 @@
 from __future__ import annotations
 
-import json
-from pathlib import Path
 from typing import Any, Dict, Optional
 
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 
+from libs.json_io import loads_json, write_json_atomic
 from pipelines.e2e import run_e2e
 from pipelines.stages import (
     Stage,
-    PipelinePaths,
+    get_paths,
     run_stage_a,
     run_stage_b,
     run_stage_c,
@@ -19,21 +18,18 @@ from pipelines.stages import (
     run_stage_f,
     run_stage_g,
     run_stage_h,
+    parse_stage,
 )
+from pipelines.utils import has_pictures_in_ocr
 
 app = FastAPI(title="Manion Deterministic Pipeline")
 
 
 def _parse_stage(value: str) -> Stage:
-    value = value.strip().lower()
-    for stage in Stage:
-        if value == stage.value:
-            return stage
-        if value == stage.name.lower():
-            return stage
-        if value == stage.value.split("_")[0]:
-            return stage
-    raise HTTPException(status_code=400, detail=f"Unknown stage: {value}")
+    try:
+        return parse_stage(value)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
 class E2ERequest(BaseModel):
@@ -59,26 +55,9 @@ class SpecUploadRequest(BaseModel):
     base_dir: Optional[str] = "ManimcodeOutput"
 
 
-def _has_pictures_in_ocr(problem_dir: Path) -> bool:
-    """OCR 결과에서 Picture가 있는지 확인"""
-    ocr_path = problem_dir / "problem.json"
-    if not ocr_path.exists():
-        return False
-    
-    try:
-        with ocr_path.open("r", encoding="utf-8") as f:
-            ocr_data = json.load(f)
-        
-        if isinstance(ocr_data, list):
-            return any(item.get("category") == "Picture" for item in ocr_data)
-        return False
-    except Exception:
-        return False
-
-
 def _run_single_stage(req: StageRequest) -> tuple[Stage, Dict[str, Any]]:
     stage = _parse_stage(req.stage)
-    paths = PipelinePaths(Path(req.base_dir), req.problem_name)
+    paths = get_paths(req.base_dir, req.problem_name)
 
     if stage == Stage.A_OCR:
         if not req.image_path:
@@ -86,7 +65,7 @@ def _run_single_stage(req: StageRequest) -> tuple[Stage, Dict[str, Any]]:
         return stage, run_stage_a(paths, image_path=req.image_path, overwrite=req.force)
     if stage == Stage.B_GRAPH:
         # Picture가 있는 경우에만 실행
-        if not _has_pictures_in_ocr(paths.problem_dir):
+        if not has_pictures_in_ocr(paths.ocr_dir):
             return stage, {"status": "skipped", "reason": "No pictures found in OCR result"}
         return stage, run_stage_b(paths)
     if stage == Stage.C_GEO_CODEGEN:
@@ -137,18 +116,19 @@ def pipeline_stage(req: StageRequest) -> Dict[str, Any]:
 
 @app.post("/pipeline/spec")
 def upload_spec(req: SpecUploadRequest) -> Dict[str, Any]:
-    paths = PipelinePaths(Path(req.base_dir), req.problem_name)
+    paths = get_paths(req.base_dir, req.problem_name)
     spec_path = paths.spec
-    spec_path.write_text(json.dumps(req.spec, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    write_json_atomic(spec_path, req.spec, trailing_newline=True)
     return {"spec_path": str(spec_path)}
 
 
 @app.get("/pipeline/spec")
 def read_spec(problem_name: str, base_dir: str = "ManimcodeOutput") -> Dict[str, Any]:
-    paths = PipelinePaths(Path(base_dir), problem_name)
-    if not paths.spec.exists():
-        raise HTTPException(status_code=404, detail="spec.json not found")
-    data = json.loads(paths.spec.read_text(encoding="utf-8"))
+    paths = get_paths(base_dir, problem_name)
+    try:
+        data = loads_json(paths.spec.read_bytes())
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="spec.json not found") from None
     return {"spec": data, "spec_path": str(paths.spec)}
 
 